@@ -32,12 +32,22 @@ def create_app(config_class=Config):
 
     login_manager.init_app(app)
 
+    from app.geocoding import ors_client
+    ors_client.init_app(app)
+
+    from app import profiling, metrics
+    profiling.init_app(app)
+    metrics.init_app(app)
+
     from app.main import bp as main_bp
     app.register_blueprint(main_bp)
 
     from app.auth import bp as auth_bp
     app.register_blueprint(auth_bp, url_prefix='/auth')
 
+    from app.api import bp as api_bp
+    app.register_blueprint(api_bp, url_prefix='/api')
+
     if not os.path.exists('logs'):
         os.mkdir('logs')
 
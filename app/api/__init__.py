@@ -0,0 +1,6 @@
+from flask import Blueprint
+
+
+bp = Blueprint('api', __name__)
+
+from app.api import routes
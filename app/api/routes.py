@@ -0,0 +1,271 @@
+import hashlib
+
+
+import numpy as np
+from flask import jsonify, request, Response, current_app
+from flask_login import login_required, current_user
+from sqlalchemy.orm import selectinload, joinedload
+
+
+from app.api import bp
+from app.importers import read_markers, import_markers, import_tracks, FILE_ERRORS
+from app.models import Trek, Route, RouteMarker, Marker, Folder
+from app.pagination import TREK_SORTS, MARKER_SORTS, requested_page
+
+
+def digest(*parts):
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def conditional(etag, payload):
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(payload())
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+@bp.route('/treks', methods=['GET'])
+@login_required
+def list_treks():
+    treks, cursor, args = requested_page(Trek.query.filter_by(user_id=current_user.id), TREK_SORTS, 'position',
+                                         Trek.id, current_app.config['TREKS_PER_PAGE'])
+    return jsonify(treks=[{
+        "id": trek.id,
+        "name": trek.name,
+        "position": trek.position,
+        "distance": trek.total_distance,
+        "ascent": trek.total_ascent,
+        "descent": trek.total_descent,
+        "routes": trek.routes_count,
+        "markers": trek.markers_count,
+        "timestamp": trek.timestamp.isoformat() if trek.timestamp else None,
+    } for trek in treks], next=cursor, **args)
+
+
+@bp.route('/markers', methods=['GET'])
+@login_required
+def list_markers():
+    query = Marker.query.filter_by(user_id=current_user.id)
+    folder_id = request.args.get('folder', type=int)
+    if folder_id is not None:
+        query = query.filter_by(folder_id=folder_id)
+    markers, cursor, args = requested_page(query, MARKER_SORTS, 'name', Marker.id, current_app.config['MARKERS_PER_PAGE'])
+    return jsonify(markers=[{
+        "id": marker.id,
+        "name": marker.name,
+        "address": marker.address,
+        "latitude": marker.latitude,
+        "longitude": marker.longitude,
+        "elevation": marker.elevation,
+        "folder": marker.folder_id,
+        "timestamp": marker.timestamp.isoformat() if marker.timestamp else None,
+    } for marker in markers], next=cursor, **args)
+
+
+def user_trek(trek_id, *options):
+    return Trek.query.filter_by(id=trek_id, user_id=current_user.id).options(*options).first_or_404()
+
+
+@bp.route('/treks/<int:trek_id>/routes', methods=['GET'])
+@login_required
+def trek_routes(trek_id):
+    zoom = request.args.get('zoom', type=int)
+    trek = user_trek(trek_id, selectinload(Trek.routes).selectinload(Route.levels))
+    etag = digest('routes', trek.id, zoom, [(route.id, route.name, route.position, route.timestamp) for route in trek.routes])
+
+    def payload():
+        return {
+            "type": "FeatureCollection",
+            "features": [{
+                "type": "Feature",
+                "geometry": {
+                    "type": "LineString",
+                    "coordinates": np.round(route.level_points(zoom).astype(np.float64), 5).tolist(),
+                },
+                "properties": {
+                    "id": route.id,
+                    "name": route.name,
+                    "distance": route.distance,
+                    "ascent": route.ascent,
+                    "descent": route.descent,
+                },
+            } for route in trek.routes],
+        }
+
+    return conditional(etag, payload)
+
+
+@bp.route('/treks/<int:trek_id>/markers', methods=['GET'])
+@login_required
+def trek_markers(trek_id):
+    trek = user_trek(trek_id, selectinload(Trek.routes).selectinload(Route.route_markers).joinedload(RouteMarker.marker))
+    route_markers = [route_marker for route in trek.routes for route_marker in route.route_markers]
+    etag = digest('markers', trek.id, [
+        (route_marker.route_id, route_marker.position, route_marker.marker.id, route_marker.marker.name,
+         route_marker.marker.address, route_marker.marker.latitude, route_marker.marker.longitude,
+         route_marker.marker.elevation, route_marker.marker.timestamp) for route_marker in route_markers])
+
+    def payload():
+        return {
+            "type": "FeatureCollection",
+            "features": [{
+                "type": "Feature",
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [route_marker.marker.longitude, route_marker.marker.latitude],
+                },
+                "properties": {
+                    "id": route_marker.marker.id,
+                    "route_id": route_marker.route_id,
+                    "name": route_marker.marker.name,
+                    "address": route_marker.marker.address,
+                    "elevation": route_marker.marker.elevation,
+                },
+            } for route_marker in route_markers],
+        }
+
+    return conditional(etag, payload)
+
+
+@bp.route('/treks/<int:trek_id>/profile', methods=['GET'])
+@login_required
+def trek_profile(trek_id):
+    trek = user_trek(trek_id, selectinload(Trek.routes))
+    etag = digest('profile', trek.id, [(route.id, route.position, route.timestamp) for route in trek.routes])
+
+    def payload():
+        return {"id": trek.id, "profile": trek.sampled_profile() or []}
+
+    return conditional(etag, payload)
+
+
+@bp.route('/routes/<int:route_id>/status', methods=['GET'])
+@login_required
+def route_status(route_id):
+    route = Route.query.join(Trek).filter(Route.id == route_id, Trek.user_id == current_user.id).first_or_404()
+    response = jsonify(id=route.id, status=route.status, distance=route.distance, ascent=route.ascent, descent=route.descent)
+    response.cache_control.no_store = True
+    return response
+
+
+@bp.route('/markers/import', methods=['POST'])
+@login_required
+def import_markers_file():
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify(error='A CSV or GPX file is required.'), 400
+    folder_id = request.form.get('folder', type=int)
+    folder = Folder.cached(folder_id) if folder_id else None
+    try:
+        result = import_markers(current_user, read_markers(upload.stream, upload.filename), folder=folder)
+    except FILE_ERRORS as error:
+        return jsonify(error=f'Invalid file: {error}.'), 400
+    return jsonify(result.as_dict())
+
+
+@bp.route('/treks/<int:trek_id>/import', methods=['POST'])
+@login_required
+def import_trek_tracks(trek_id):
+    trek = user_trek(trek_id)
+    upload = request.files.get('file')
+    if upload is None or not upload.filename.lower().endswith('.gpx'):
+        return jsonify(error='A GPX file is required.'), 400
+    folder_id = request.form.get('folder', type=int)
+    folder = Folder.cached(folder_id) if folder_id else None
+    try:
+        routes, markers = import_tracks(trek, upload.stream, folder=folder)
+    except FILE_ERRORS as error:
+        return jsonify(error=f'Invalid GPX file: {error}.'), 400
+    return jsonify(routes=[{
+        "id": route.id,
+        "name": route.name,
+        "distance": route.distance,
+        "ascent": route.ascent,
+        "descent": route.descent,
+        "markers": len(route.markers),
+    } for route in routes], markers=markers)
+
+
+def marker_feature(marker, distance=None):
+    properties = {"id": marker.id, "name": marker.name, "address": marker.address, "elevation": marker.elevation}
+    if distance is not None:
+        properties["distance"] = round(distance, 1)
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [marker.longitude, marker.latitude]},
+        "properties": properties,
+    }
+
+
+@bp.route('/markers/search', methods=['GET'])
+@login_required
+def search_markers():
+    query = Marker.query.filter_by(user_id=current_user.id)
+    folder_id = request.args.get('folder', type=int)
+    if folder_id is not None:
+        query = query.filter_by(folder_id=folder_id)
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+
+    markers, has_next = Marker.search(query, request.args.get('q', ''), page, per_page)
+    return jsonify(markers=[{
+        "id": marker.id,
+        "name": marker.name,
+        "address": marker.address,
+        "folder": marker.folder_id,
+    } for marker in markers], page=page, has_next=has_next)
+
+
+@bp.route('/markers/nearby', methods=['GET'])
+@login_required
+def nearby_markers():
+    query = Marker.query.filter_by(user_id=current_user.id)
+    limit = min(max(request.args.get('limit', 500, type=int), 1), 5000)
+
+    bbox = request.args.get('bbox')
+    if bbox:
+        try:
+            west, south, east, north = [float(value) for value in bbox.split(',')]
+        except ValueError:
+            return jsonify(error='bbox must be west,south,east,north.'), 400
+        markers = Marker.within(query, south, west, north, east).order_by(Marker.name).limit(limit).all()
+        return jsonify(type="FeatureCollection", features=[marker_feature(marker) for marker in markers])
+
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lon', type=float)
+    if latitude is None or longitude is None:
+        return jsonify(error='Either bbox or lat and lon are required.'), 400
+    if 'k' in request.args:
+        found = Marker.nearest(query, latitude, longitude, min(max(request.args.get('k', 10, type=int), 1), limit))
+    else:
+        radius = min(request.args.get('radius', 1000.0, type=float), 50000.0)
+        found = Marker.near(query, latitude, longitude, radius)[:limit]
+    return jsonify(type="FeatureCollection", features=[marker_feature(marker, distance) for marker, distance in found])
+
+
+@bp.route('/routes/nearby', methods=['GET'])
+@login_required
+def nearby_routes():
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lon', type=float)
+    if latitude is None or longitude is None:
+        return jsonify(error='lat and lon are required.'), 400
+    radius = min(request.args.get('radius', 500.0, type=float), 50000.0)
+
+    query = Route.query.join(Trek).filter(Trek.user_id == current_user.id).options(joinedload(Route.trek))
+    found = Route.corridor(query, latitude, longitude, radius)
+
+    treks = {}
+    for route, distance, along in found:
+        treks.setdefault(route.trek.id, {"id": route.trek.id, "name": route.trek.name, "distance": round(distance, 1)})
+    return jsonify(routes=[{
+        "id": route.id,
+        "name": route.name,
+        "trek": route.trek.id,
+        "distance": round(distance, 1),
+        "along": round(along, 1),
+    } for route, distance, along in found], treks=list(treks.values()))
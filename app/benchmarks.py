@@ -0,0 +1,159 @@
+import json
+import time
+import platform
+import tracemalloc
+from datetime import datetime
+
+
+import numpy as np
+from flask import g
+
+
+from app import create_app, db, geometry
+from app.geocoding import ors_client, export_trek_as_gpx, stream_trek_as_gpx
+from app.models import User, Trek, Route, Marker, Profile, Preference
+from config import Config
+
+
+SIZES = (1000, 10000, 100000)
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_RECORD_QUERIES = False
+    WTF_CSRF_ENABLED = False
+    SECRET_KEY = 'bench'
+    DIRECTIONS_CACHE_BACKEND = 'memory'
+
+
+def synthetic_path(size, seed=0):
+    """A random walk of size lon/lat/ele points starting in the Alps."""
+    generator = np.random.default_rng(seed)
+    steps = generator.normal(0, 0.0002, (size, 3)) * [1, 1, 20000]
+    return np.cumsum(steps, axis=0) + [5.7, 45.1, 1000.0]
+
+
+def synthetic_user(points, treks=5, routes=4, seed=0):
+    """A user owning treks of points track points each, split across routes."""
+    user = User(username='bench', email='bench@example.com')
+    user.set_password('bench')
+    for t in range(treks):
+        trek = Trek(name=f'Trek {t}')
+        for r in range(routes):
+            path = synthetic_path(max(points // routes, 2), seed=seed + t * routes + r)
+            route = Route(name=f'Route {t}.{r}', geometry=geometry.pack(path))
+            route.distance = float(geometry.segment_distances(path[:, [1, 0, 2]]).sum())
+            route.ascent, route.descent = geometry.climb(path[:, 2])
+            for index in (0, -1):
+                longitude, latitude, elevation = path[index]
+                route.markers.append(Marker(name=f'Marker {t}.{r}.{index}', latitude=latitude,
+                                            longitude=longitude, elevation=elevation))
+            trek.routes.append(route)
+        user.treks.append(trek)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def cold(function):
+    """Drop the per-request geometry memo so every call pays for decoding."""
+    def run():
+        g.pop('geometries', None)
+        return function()
+    return run
+
+
+def cases(app, user):
+    trek = user.treks[0]
+    route = trek.routes[0]
+    points = route.points()
+    polyline = geometry.encode_polyline(points.astype(np.float64).tolist())
+    pairs = list(zip(points[:-1, [1, 0]].tolist(), points[1:, [1, 0]].tolist()))
+
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'bench', 'password': 'bench'})
+
+    return [
+        ('route.coordinates', cold(route.coordinates)),
+        ('polyline.decode', lambda: ors_client.decode_geometry(polyline)),
+        ('ors_client.haversine', lambda: [ors_client.haversine(a, b) for a, b in pairs]),
+        ('trek.elevation_profile', cold(trek.elevation_profile)),
+        ('export_trek_as_gpx', cold(lambda: export_trek_as_gpx(trek))),
+        ('stream_trek_as_gpx', cold(lambda: sum(len(chunk) for chunk in stream_trek_as_gpx(trek)))),
+        ('index.html', lambda: client.get('/index').get_data()),
+    ]
+
+
+def measure(function, min_time=0.5):
+    """Calls per second, repeating the function for at least min_time seconds."""
+    count, start = 0, time.perf_counter()
+    while True:
+        function()
+        count += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return count / elapsed
+
+
+def peak_memory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(sizes=SIZES, min_time=0.5, select=(), config_class=BenchConfig):
+    app = create_app(config_class)
+    results = []
+    with app.app_context():
+        for size in sizes:
+            db.create_all()
+            Profile.insert_modes()
+            Preference.insert_options()
+            for name, function in cases(app, synthetic_user(size)):
+                if select and not any(pattern in name for pattern in select):
+                    continue
+                function()
+                results.append({
+                    "name": name,
+                    "points": size,
+                    "ops_per_sec": measure(function, min_time),
+                    "peak_memory": peak_memory(function),
+                })
+            db.session.remove()
+            db.drop_all()
+            g.pop('geometries', None)
+    return results
+
+
+def save(results, path):
+    with open(path, 'w', encoding='utf-8') as stream:
+        json.dump({
+            "python": platform.python_version(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "results": results,
+        }, stream, indent=2)
+
+
+def load(path):
+    with open(path, encoding='utf-8') as stream:
+        return json.load(stream)["results"]
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Messages for every result slower or hungrier than its baseline by more than tolerance."""
+    reference = {(result["name"], result["points"]): result for result in baseline}
+    regressions = []
+    for result in results:
+        base = reference.get((result["name"], result["points"]))
+        if base is None:
+            continue
+        if result["ops_per_sec"] < base["ops_per_sec"] * (1 - tolerance):
+            regressions.append(f"{result['name']} @ {result['points']}: "
+                               f"{result['ops_per_sec']:.1f} ops/s, baseline {base['ops_per_sec']:.1f} ops/s")
+        if result["peak_memory"] > base["peak_memory"] * (1 + tolerance):
+            regressions.append(f"{result['name']} @ {result['points']}: "
+                               f"{result['peak_memory']} bytes peak, baseline {base['peak_memory']} bytes")
+    return regressions
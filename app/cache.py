@@ -0,0 +1,146 @@
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+
+registry = []
+
+
+class CacheStats:
+    def __init__(self, name):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def __repr__(self):
+        return f"<CacheStats {self.name}, Hits {self.hits}, Misses {self.misses}>"
+
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+
+class MemoryBackend:
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+class DatabaseBackend:
+    def __init__(self, model, size):
+        self.model = model
+        self.size = size
+
+    def get(self, key):
+        row = self.model.query.filter_by(key=key).first()
+        if row is None:
+            return None
+        row.accessed = datetime.utcnow()
+        return row.value()
+
+    def set(self, key, value):
+        with self.model.query.session.no_autoflush:
+            row = self.model.query.filter_by(key=key).first()
+            if row is None:
+                excess = self.model.query.count() - self.size + 1
+                if excess > 0:
+                    oldest = [id for id, in self.model.query.with_entities(self.model.id)
+                              .order_by(self.model.accessed).limit(excess)]
+                    self.model.query.filter(self.model.id.in_(oldest)).delete(synchronize_session=False)
+                row = self.model(key=key)
+                self.model.query.session.add(row)
+        row.assign(value)
+        row.accessed = datetime.utcnow()
+
+
+class VersionedCache:
+    """A value built by loader() and shared by every thread of the process.
+
+    version() is polled at most every interval seconds and the value is rebuilt
+    when it changes, so writes made by other processes show up within interval.
+    invalidate() drops the value of this process at once.
+    """
+
+    def __init__(self, loader, version, interval, stats=None):
+        self.loader = loader
+        self.version = version
+        self.interval = interval
+        self.stats = stats
+        self._value = None
+        self._version = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._value is not None and now - self._checked < self.interval:
+                if self.stats:
+                    self.stats.hit()
+                return self._value
+            version = self.version()
+            self._checked = now
+            if self._value is None or version != self._version:
+                if self.stats:
+                    self.stats.miss()
+                self._value, self._version = self.loader(), version
+            elif self.stats:
+                self.stats.hit()
+            return self._value
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+
+
+def create_backend(name, size, model=None):
+    if name == 'memory':
+        return MemoryBackend(size)
+    if name == 'database':
+        return DatabaseBackend(model, size)
+    return NullBackend()
+
+
+geocode_stats = CacheStats('geocode')
+directions_stats = CacheStats('directions')
+tile_stats = CacheStats('elevation_tiles')
+reference_stats = CacheStats('references')
@@ -3,10 +3,18 @@ import click
 
 
 from flask import current_app
-from sqlalchemy import text
+from sqlalchemy import inspect, text
+from werkzeug.serving import run_simple
 
 
-from app import db
+from app import db, geometry, benchmarks
+from app.elevation import elevation_provider
+from app.geocoding import ors_client
+from app.importers import read_markers, import_markers, import_tracks, FILE_ERRORS
+from app.jobs import run_pending
+from app.models import (User, Trek, Route, Marker, Direction, Folder, invalidate_references,
+                        ROUTE_SEGMENT_INDEX_DDL, MARKER_INDEX_DDL)
+from app.standin import create_standin
 
 
 def register(app):
@@ -64,7 +72,191 @@ def register(app):
                 script_file = f.read()
                 for statement in script_file.split(';'):
                     db.session.execute(statement)
+
+        invalidate_references()
+        db.session.commit()
                     
+    @sqlite.command()
+    def upgrade():
+        """Upgrade an existing database to the current schema."""
+        db.create_all()
+        if db.engine.dialect.name == 'sqlite':
+            # Index tables are only created along with new tables; existing ones need them before any row changes.
+            db.session.execute(text(ROUTE_SEGMENT_INDEX_DDL))
+            db.session.execute(text(MARKER_INDEX_DDL))
+
+        inspector = inspect(db.engine)
+        for table in db.metadata.sorted_tables:
+            columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in columns:
+                    db.session.execute(text(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(db.engine.dialect)}"))
+            for index in table.indexes:
+                index.create(db.session.connection(), checkfirst=True)
+
+        if 'path' in {column['name'] for column in inspector.get_columns('route')}:
+            rows = db.session.execute(text(
+                "SELECT id, path FROM route WHERE path IS NOT NULL AND geometry IS NULL")).fetchall()
+            for id, path in rows:
+                Route.query.get(id).geometry = geometry.pack(ors_client.decode_geometry(path))
+            click.echo(f"{len(rows)} routes converted.")
+        Direction.query.filter(Direction.geometry.is_(None)).delete()
+
+        for trek in Trek.query.filter(Trek.routes_count.is_(None) | Trek.profile_sample.is_(None)):
+            trek.aggregate()
+        for route in Route.query.filter(Route.geometry.isnot(None), ~Route.levels.any()):
+            route.simplify()
+        for marker in Marker.query.filter(Marker.search_name.is_(None), Marker.name.isnot(None)):
+            marker.search_name = Marker.normalize(marker.name)
+        Route.reindex()
+        Marker.reindex()
+        db.session.commit()
+
+    @app.cli.group()
+    def markers():
+        """Marker maintenance commands."""
+        pass
+
+    @markers.command()
+    @click.option('--batch', default=1000, help='Number of markers per transaction.')
+    def elevate(batch):
+        """Recompute the elevation of every marker."""
+        provider = elevation_provider()
+        query = Marker.query.filter(Marker.latitude.isnot(None), Marker.longitude.isnot(None)).order_by(Marker.id)
+        count = 0
+        for offset in range(0, query.count(), batch):
+            markers = query.offset(offset).limit(batch).all()
+            elevations = provider.elevations([(marker.latitude, marker.longitude) for marker in markers])
+            for marker, elevation in zip(markers, elevations):
+                marker.elevation = elevation
+            db.session.commit()
+            count += len(markers)
+        click.echo(f"{count} markers elevated.")
+
+    @markers.command('import')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--user', 'username', required=True, help='Owner of the imported markers.')
+    @click.option('--folder', help='Folder of rows that do not name one.')
+    @click.option('--workers', type=int, help='Number of concurrent geocoding requests.')
+    @click.option('--batch', type=int, help='Number of markers per transaction.')
+    def import_(path, username, folder, workers, batch):
+        """Import markers from a CSV or GPX file."""
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.BadParameter(f"Unknown user {username}.", param_hint='--user')
+        if folder is not None:
+            folder = Folder.query.filter_by(name=folder).first()
+            if folder is None:
+                raise click.BadParameter("Unknown folder.", param_hint='--folder')
+
+        try:
+            with open(path, 'rb') as stream:
+                result = import_markers(user, read_markers(stream, path), folder=folder, workers=workers, batch=batch)
+        except FILE_ERRORS as error:
+            raise click.ClickException(f"Invalid file: {error}.")
+        for line, name, message in result.failures:
+            click.echo(f"Line {line} ({name}): {message}", err=True)
+        click.echo(f"{result.created} markers imported, {result.skipped} skipped, {len(result.failures)} failed.")
+
+    @app.cli.group()
+    def treks():
+        """Trek maintenance commands."""
+        pass
+
+    @treks.command()
+    def aggregate():
+        """Rebuild the distance, ascent, descent and count columns of every trek."""
+        treks = Trek.query.all()
+        for trek in treks:
+            trek.aggregate()
+        db.session.commit()
+        click.echo(f"{len(treks)} treks aggregated.")
+
+    @treks.command('import')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--trek', 'trek_id', type=int, required=True, help='Trek receiving the imported routes.')
+    @click.option('--folder', help='Folder of the markers created from waypoints.')
+    def import_tracks_(path, trek_id, folder):
+        """Import the tracks of a GPX file as routes."""
+        trek = Trek.query.get(trek_id)
+        if trek is None:
+            raise click.BadParameter(f"Unknown trek {trek_id}.", param_hint='--trek')
+        if folder is not None:
+            folder = Folder.query.filter_by(name=folder).first()
+            if folder is None:
+                raise click.BadParameter("Unknown folder.", param_hint='--folder')
+
+        try:
+            with open(path, 'rb') as stream:
+                routes, markers = import_tracks(trek, stream, folder=folder)
+        except FILE_ERRORS as error:
+            raise click.ClickException(f"Invalid GPX file: {error}.")
+        for route in routes:
+            click.echo(f"{route.name}: {route.distance / 1000:.1f} km, +{route.ascent:.0f} m, -{route.descent:.0f} m")
+        click.echo(f"{len(routes)} routes imported, {markers} markers created.")
+
+    @app.cli.group()
+    def jobs():
+        """Background job commands."""
+        pass
+
+    @jobs.command('run')
+    def run_jobs():
+        """Run every pending route recomputation."""
+        click.echo(f"{run_pending()} jobs processed.")
+
+    @app.cli.group()
+    def ors():
+        """OpenRouteService stand-in commands."""
+        pass
+
+    @ors.command()
+    @click.option('--host', default='127.0.0.1', help='Interface to listen on.')
+    @click.option('--port', default=8080, help='Port to listen on.')
+    @click.option('--recordings', type=click.Path(dir_okay=False), help='JSON file of recorded responses.')
+    @click.option('--record', is_flag=True, help='Forward unrecorded requests to ORS and record the responses.')
+    @click.option('--latency', default=0.0, help='Delay added to every response, in seconds.')
+    @click.option('--jitter', default=0.0, help='Random extra delay of up to this many seconds.')
+    @click.option('--error-rate', default=0.0, help='Fraction of requests answered with an error.')
+    @click.option('--error-status', default=503, help='HTTP status of injected errors.')
+    @click.option('--seed', type=int, help='Seed of the latency and error generator.')
+    def serve(host, port, recordings, record, latency, jitter, error_rate, error_status, seed):
+        """Serve an ORS-compatible stand-in; point ORS_BASE_URL at it."""
+        upstream = 'https://api.openrouteservice.org' if record else None
+        standin = create_standin(recordings, upstream=upstream, token=current_app.config['ORS_TOKEN'],
+                                 latency=latency, jitter=jitter, error_rate=error_rate,
+                                 error_status=error_status, seed=seed)
+        run_simple(host, port, standin, threaded=True)
+
+    @app.cli.group()
+    def bench():
+        """Performance benchmark commands."""
+        pass
+
+    @bench.command('run')
+    @click.option('--sizes', default=','.join(map(str, benchmarks.SIZES)), help='Comma separated trek sizes, in points.')
+    @click.option('--min-time', default=0.5, help='Minimum duration of each measurement, in seconds.')
+    @click.option('--select', multiple=True, help='Only run the benchmarks whose name contains this text.')
+    @click.option('--output', type=click.Path(dir_okay=False), help='Save the results to this JSON file.')
+    @click.option('--baseline', type=click.Path(exists=True, dir_okay=False), help='Compare against these results.')
+    @click.option('--tolerance', default=0.2, help='Allowed slowdown or memory growth against the baseline.')
+    def run_bench(sizes, min_time, select, output, baseline, tolerance):
+        """Measure the geometry, export and rendering hot paths."""
+        sizes = [int(size) for size in sizes.split(',')]
+        results = benchmarks.run(sizes, min_time=min_time, select=select)
+        for result in results:
+            click.echo(f"{result['name']:<24}{result['points']:>8} points"
+                       f"{result['ops_per_sec']:>12.1f} ops/s{result['peak_memory'] / 1024:>12.0f} KiB")
+        if output:
+            benchmarks.save(results, output)
+        if baseline:
+            regressions = benchmarks.compare(results, benchmarks.load(baseline), tolerance)
+            for regression in regressions:
+                click.echo(f"Regression: {regression}", err=True)
+            if regressions:
+                raise click.ClickException(f"{len(regressions)} regressions against {baseline}.")
+
     @app.cli.group()
     def test():
         """Unit testing framework commands."""
@@ -0,0 +1,111 @@
+import os
+import math
+import threading
+from collections import OrderedDict
+
+
+import numpy as np
+from flask import current_app
+
+
+from app.cache import tile_stats
+from app.geocoding import ors_client
+
+
+HGT_VOID = -32768
+
+
+class ElevationProvider:
+    def elevation(self, latitude, longitude):
+        return self.elevations([(latitude, longitude)])[0]
+
+    def elevations(self, locations):
+        raise NotImplementedError
+
+
+class ORSElevationProvider(ElevationProvider):
+    def elevations(self, locations):
+        return [ors_client.elevation(latitude, longitude) for latitude, longitude in locations]
+
+
+class DEMElevationProvider(ElevationProvider):
+    """Bilinear elevation lookups on SRTM .hgt tiles, memory-mapped and kept in an LRU."""
+
+    def __init__(self, directory, tiles=16, fallback=None):
+        self.directory = directory
+        self.tiles = tiles
+        self.fallback = fallback
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def tile_name(latitude, longitude):
+        lat, lon = int(math.floor(latitude)), int(math.floor(longitude))
+        return f"{'N' if lat >= 0 else 'S'}{abs(lat):02d}{'E' if lon >= 0 else 'W'}{abs(lon):03d}.hgt"
+
+    def tile(self, latitude, longitude):
+        name = self.tile_name(latitude, longitude)
+        with self._lock:
+            if name in self._cache:
+                tile_stats.hit()
+                self._cache.move_to_end(name)
+                return self._cache[name]
+        tile_stats.miss()
+
+        path = os.path.join(self.directory, name)
+        data = None
+        if os.path.exists(path):
+            size = int(math.sqrt(os.path.getsize(path) // 2))
+            data = np.memmap(path, dtype='>i2', mode='r', shape=(size, size))
+
+        with self._lock:
+            self._cache[name] = data
+            self._cache.move_to_end(name)
+            while len(self._cache) > self.tiles:
+                self._cache.popitem(last=False)
+        return data
+
+    def elevations(self, locations):
+        locations = np.asarray(locations, dtype=np.float64).reshape(-1, 2)
+        result = np.full(len(locations), np.nan)
+
+        origins = np.floor(locations)
+        for origin in np.unique(origins, axis=0):
+            index = np.flatnonzero((origins == origin).all(axis=1))
+            data = self.tile(origin[0], origin[1])
+            if data is None:
+                continue
+
+            size = data.shape[0]
+            row = (origin[0] + 1 - locations[index, 0]) * (size - 1)
+            col = (locations[index, 1] - origin[1]) * (size - 1)
+            r0 = np.clip(np.floor(row).astype(int), 0, size - 2)
+            c0 = np.clip(np.floor(col).astype(int), 0, size - 2)
+            dr, dc = row - r0, col - c0
+
+            corners = np.stack([data[r0, c0], data[r0, c0 + 1], data[r0 + 1, c0], data[r0 + 1, c0 + 1]]).astype(np.float64)
+            corners[corners == HGT_VOID] = np.nan
+            result[index] = (corners[0] * (1 - dr) * (1 - dc) + corners[1] * (1 - dr) * dc +
+                             corners[2] * dr * (1 - dc) + corners[3] * dr * dc)
+
+        elevations = [None if math.isnan(value) else float(value) for value in result]
+
+        missing = [i for i, value in enumerate(elevations) if value is None]
+        if missing and self.fallback is not None:
+            for i, value in zip(missing, self.fallback.elevations([tuple(locations[i]) for i in missing])):
+                elevations[i] = value
+        return elevations
+
+
+def create_provider(config):
+    provider = ORSElevationProvider()
+    if config.get('ELEVATION_DEM_DIRECTORY'):
+        provider = DEMElevationProvider(
+            config['ELEVATION_DEM_DIRECTORY'], tiles=config['ELEVATION_DEM_TILES'], fallback=provider)
+    return provider
+
+
+def elevation_provider():
+    if 'elevation' not in current_app.extensions:
+        current_app.extensions['elevation'] = create_provider(current_app.config)
+    return current_app.extensions['elevation']
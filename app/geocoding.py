@@ -1,18 +1,29 @@
-import math
-import requests
+import logging
+import threading
 
 
-import openrouteservice
+import requests
+from openrouteservice import exceptions
 from openrouteservice.convert import decode_polyline
 from openrouteservice.geocode import pelias_search
 from openrouteservice.elevation import elevation_point
 from openrouteservice.directions import directions
 import gpxpy
 import gpxpy.gpx
+import gpxpy.gpxfield
 
+from app import geometry
+from app.metrics import ors_failures
+from app.transport import create_transport
 from config import Config
 
 
+logger = logging.getLogger(__name__)
+
+
+ors_errors = (requests.exceptions.RequestException, exceptions.ApiError, exceptions.HTTPError, exceptions.Timeout)
+
+
 ors_profile = {
     "Driving": "driving-car",       # "driving-hgv"
     "Cycling": "cycling-regular",   # "cycling-road", "cycling-mountain", "cycling-electric"
@@ -37,16 +48,39 @@ ors_format = {
 
 class ORSClient:
     def __init__(self):
-        self.client = openrouteservice.Client(Config.ORS_TOKEN)
+        self.config = vars(Config)
+        self._client = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.config = app.config
+        self._client = None
+
+    @property
+    def client(self):
+        # Built on first use, so that an app without an ORS token starts as long as it makes no ORS request.
+        with self._lock:
+            if self._client is None:
+                self._client = create_transport(self.config)
+            return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
 
     def search(self, address):
         try:
             request = pelias_search(
                 client=self.client, text=address)
-        except requests.exceptions.ConnectionError:
+        except ors_errors as error:
+            ors_failures.inc('geocode')
+            logger.warning(f"ORS geocode request failed: {error!r}")
             return None
 
-        geometry = request["features"][0]["geometry"]
+        features = request["features"]
+        if not features:
+            return None
+        geometry = features[0]["geometry"]
         if len(geometry):
             return geometry["coordinates"]
         else:
@@ -58,7 +92,9 @@ class ORSClient:
             request = elevation_point(
                 client=self.client, geometry=coordinates,
                 format_in="point", format_out=ors_format["Geojson"])
-        except requests.exceptions.ConnectionError:
+        except ors_errors as error:
+            ors_failures.inc('elevation')
+            logger.warning(f"ORS elevation request failed: {error!r}")
             return None
 
         geometry = request["geometry"]
@@ -74,7 +110,9 @@ class ORSClient:
                                  profile=profile, preference=preference,
                                  elevation=True, instructions=False,
                                  format=ors_format["Json"])
-        except requests.exceptions.ConnectionError:
+        except ors_errors as error:
+            ors_failures.inc('directions')
+            logger.warning(f"ORS directions request failed: {error!r}")
             return None
 
         routes = request["routes"]
@@ -89,18 +127,7 @@ class ORSClient:
         return decode_polyline(polyline=geometry, is3d=True)["coordinates"]
 
     def haversine(self, coord1, coord2):
-        r = 6372800
-        lat1, lon1 = (coord1[0], coord1[1])
-        lat2, lon2 = (coord2[0], coord2[1])
-
-        phi1, phi2 = math.radians(lat1), math.radians(lat2)
-        dphi = math.radians(lat2 - lat1)
-        dlambda = math.radians(lon2 - lon1)
-
-        a = math.sin(dphi / 2) ** 2 + \
-            math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
-
-        return 2 * r * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+        return float(geometry.haversine(coord1[0], coord1[1], coord2[0], coord2[1]))
 
 
 ors_client = ORSClient()
@@ -129,3 +156,41 @@ def export_trek_as_gpx(trek):
             gpx.waypoints.append(gpx_waypoint)
 
     return gpx.to_xml()
+
+
+def stream_trek_as_gpx(trek, chunk=1000):
+    gpx = gpxpy.gpx.GPX()
+
+    gpx.author_name = trek.user.username
+    gpx.author_email = trek.user.email
+    gpx.name = trek.name
+
+    for route in trek.routes:
+        for marker in route.markers:
+            gpx_waypoint = gpxpy.gpx.GPXWaypoint(name=marker.name, latitude=marker.latitude, longitude=marker.longitude, elevation=marker.elevation)
+            gpx.waypoints.append(gpx_waypoint)
+
+    header = gpx.to_xml()
+    footer = "\n</gpx>"
+    yield header[:-len(footer)]
+
+    for route in trek.routes:
+        gpx_track = gpxpy.gpx.GPXTrack()
+        gpx_track.name = route.name
+        gpx_track.segments.append(gpxpy.gpx.GPXTrackSegment())
+
+        envelope = gpxpy.gpxfield.gpx_fields_to_xml(gpx_track, "trk", gpx.version, nsmap=gpx.nsmap, indent="  ")
+        head, tail = envelope.rsplit("\n    </trkseg>", 1)
+        yield head
+
+        coordinates = geometry.latlon(geometry.unpack(route.geometry))
+        for start in range(0, len(coordinates), chunk):
+            yield "".join(
+                gpxpy.gpxfield.gpx_fields_to_xml(
+                    gpxpy.gpx.GPXTrackPoint(latitude=location[0], longitude=location[1], elevation=location[2]),
+                    "trkpt", gpx.version, nsmap=gpx.nsmap, indent="      ")
+                for location in coordinates[start:start + chunk].tolist())
+
+        yield "\n    </trkseg>" + tail
+
+    yield footer
@@ -0,0 +1,182 @@
+import zlib
+
+
+import numpy as np
+
+
+EARTH_RADIUS = 6372800
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = np.radians(np.subtract(lat2, lat1))
+    dlambda = np.radians(np.subtract(lon2, lon1))
+
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+
+    return 2 * EARTH_RADIUS * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def segment_distances(coordinates):
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    if len(coordinates) < 2:
+        return np.zeros(0)
+    return haversine(coordinates[:-1, 0], coordinates[:-1, 1], coordinates[1:, 0], coordinates[1:, 1])
+
+
+def radius_box(latitude, longitude, radius):
+    """South, west, north, east bounds of the circle of radius metres; west > east when it crosses the antimeridian."""
+    angle = radius / EARTH_RADIUS
+    south, north = latitude - np.degrees(angle), latitude + np.degrees(angle)
+    if south <= -90 or north >= 90 or angle >= np.pi / 2:
+        return max(south, -90.0), -180.0, min(north, 90.0), 180.0
+    spread = float(np.degrees(np.arcsin(min(1.0, np.sin(angle) / np.cos(np.radians(latitude))))))
+    return south, (longitude - spread + 540) % 360 - 180, north, (longitude + spread + 540) % 360 - 180
+
+
+def longitude_ranges(west, east):
+    """One or two west/east ranges covering the span, splitting it at the antimeridian."""
+    if west <= east:
+        return [(west, east)]
+    return [(west, 180.0), (-180.0, east)]
+
+
+def approach(latitude, longitude, latitude1, longitude1, latitude2, longitude2):
+    """Distance in metres from the point to each segment, and the fraction along the segment of the closest point.
+
+    Segments are projected on the plane tangent at the point, which is accurate for corridors of a few kilometres.
+    """
+    scale = np.cos(np.radians(latitude))
+    x1 = (np.subtract(longitude1, longitude) + 540) % 360 - 180
+    x2 = (np.subtract(longitude2, longitude) + 540) % 360 - 180
+    x1, x2 = np.radians(x1) * scale, np.radians(x2) * scale
+    y1, y2 = np.radians(np.subtract(latitude1, latitude)), np.radians(np.subtract(latitude2, latitude))
+    dx, dy = x2 - x1, y2 - y1
+    length = dx ** 2 + dy ** 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = np.where(length > 0, np.clip(-(x1 * dx + y1 * dy) / length, 0, 1), 0.0)
+    return EARTH_RADIUS * np.hypot(x1 + fraction * dx, y1 + fraction * dy), fraction
+
+
+def cumulative_distances(coordinates):
+    distances = np.zeros(len(coordinates))
+    np.cumsum(segment_distances(coordinates), out=distances[1:])
+    return distances
+
+
+def elevation_profile(coordinates):
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    return cumulative_distances(coordinates) / 1000, coordinates[:, 2]
+
+
+def climb(elevations):
+    steps = np.diff(np.asarray(elevations, dtype=np.float64))
+    return float(steps[steps > 0].sum()), float(-steps[steps < 0].sum())
+
+
+def fill_gaps(values):
+    values = np.asarray(values, dtype=np.float64)
+    known = ~np.isnan(values)
+    if not known.any():
+        return np.zeros(len(values))
+    if known.all():
+        return values
+    index = np.arange(len(values))
+    return np.interp(index, index[known], values[known])
+
+
+def latlon(points):
+    return np.round(points[:, [1, 0, 2]].astype(np.float64), 5)
+
+
+def pack(coordinates):
+    return zlib.compress(np.ascontiguousarray(coordinates, dtype=np.float32).tobytes())
+
+
+def unpack(blob, columns=3):
+    if not blob:
+        return np.zeros((0, columns), dtype=np.float32)
+    return np.frombuffer(zlib.decompress(blob), dtype=np.float32).reshape(-1, columns)
+
+
+def encode_polyline(coordinates):
+    def encode(value):
+        value = ~(value << 1) if value < 0 else value << 1
+        chunks = []
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+        return "".join(chunks)
+
+    polyline = []
+    previous = (0, 0, 0)
+    for longitude, latitude, elevation in coordinates:
+        current = (int(round(latitude * 1e5)), int(round(longitude * 1e5)), int(round(elevation * 1e2)))
+        polyline.extend(encode(c - p) for c, p in zip(current, previous))
+        previous = current
+    return "".join(polyline)
+
+
+def simplify(points, tolerance):
+    points = np.asarray(points)
+    if len(points) < 3:
+        return points
+
+    latitude = np.radians(np.mean(points[:, 1]))
+    xy = np.column_stack([points[:, 0] * np.cos(latitude), points[:, 1]]).astype(np.float64)
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        a, b = xy[first], xy[last]
+        ab = b - a
+        ap = xy[first + 1:last] - a
+        length = np.dot(ab, ab)
+        t = np.clip(ap @ ab / length, 0, 1) if length else np.zeros(len(ap))
+        distances = np.hypot(*(ap - np.outer(t, ab)).T)
+
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            index += first + 1
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return points[keep]
+
+
+def zoom_tolerance(zoom):
+    return 360 / (256 * 2 ** zoom)
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of threshold points preserving the shape of (x, y)."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    indices = np.zeros(threshold, dtype=int)
+    indices[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        next_start, next_end = end, min(int((i + 2) * every) + 1, n)
+        if next_start < next_end:
+            avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+
+    return indices
@@ -0,0 +1,324 @@
+import io
+import csv
+import math
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree import ElementTree
+
+
+import numpy as np
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+
+from app import db, geometry
+from app.elevation import elevation_provider
+from app.geocoding import ors_client
+from app.models import Route, Marker, Geocode, Country, Folder
+
+
+# Raised while reading a file that is not UTF-8 CSV or well-formed GPX, which no row can be reported for.
+FILE_ERRORS = (UnicodeDecodeError, csv.Error, ElementTree.ParseError)
+
+
+class ImportRow:
+    def __init__(self, line, name, address=None, country=None, folder=None, latitude=None, longitude=None, elevation=None,
+                 error=None):
+        self.line = line
+        self.name = name
+        self.address = address
+        self.country = country
+        self.folder = folder
+        self.latitude = latitude
+        self.longitude = longitude
+        self.elevation = elevation
+        self.error = error
+
+    def __repr__(self):
+        return f"<ImportRow {self.line}, Name {self.name}, Address {self.address}>"
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.skipped = 0
+        self.failures = []
+
+    def fail(self, row, message):
+        self.failures.append((row.line, row.name, message))
+
+    def as_dict(self):
+        return {
+            "created": self.created,
+            "skipped": self.skipped,
+            "failures": [{"line": line, "name": name, "error": message} for line, name, message in self.failures],
+        }
+
+    def __repr__(self):
+        return f"<ImportResult Created {self.created}, Skipped {self.skipped}, Failures {len(self.failures)}>"
+
+
+def number(value):
+    return float(value) if value not in (None, "") else None
+
+
+def local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def read_csv(stream):
+    """Rows of a CSV file with a header of name, address, country, folder, latitude, longitude, elevation."""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    for line, record in enumerate(reader, start=2):
+        record = {key.strip().lower(): (value or "").strip() for key, value in record.items() if key}
+        row = ImportRow(line, record.get('name'), address=record.get('address') or None,
+                        country=record.get('country') or None, folder=record.get('folder') or None)
+        try:
+            row.latitude, row.longitude, row.elevation = (
+                number(record.get(key)) for key in ('latitude', 'longitude', 'elevation'))
+        except ValueError:
+            row.error = "Latitude, longitude and elevation must be numbers."
+        yield row
+
+
+def iterparse_gpx(stream, tags):
+    """Yield the given GPX elements once complete, detaching each one so large files parse in flat memory."""
+    parents = []
+    for event, element in ElementTree.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            parents.append(element)
+            continue
+        parents.pop()
+        tag = local_name(element.tag)
+        if tag in tags:
+            yield tag, element
+            if parents:
+                parents[-1].remove(element)
+
+
+def fields(element):
+    return {local_name(child.tag): (child.text or "").strip() for child in element}
+
+
+def waypoint_row(element, line):
+    values = fields(element)
+    name = values.get('name') or f"Waypoint {line}"
+    try:
+        latitude, longitude = float(element.get('lat')), float(element.get('lon'))
+        elevation = number(values.get('ele'))
+    except (TypeError, ValueError):
+        return ImportRow(line, name, error="Missing or invalid lat, lon or ele.")
+    return ImportRow(line, name,
+                     address=values.get('desc') or values.get('cmt') or f"{latitude:.5f}, {longitude:.5f}",
+                     latitude=latitude, longitude=longitude, elevation=elevation)
+
+
+def read_gpx_waypoints(stream):
+    """Waypoints of a GPX file."""
+    for line, (_, element) in enumerate(iterparse_gpx(stream, {'wpt'}), start=1):
+        yield waypoint_row(element, line)
+
+
+def read_gpx_tracks(stream):
+    """Tracks and routes of a GPX file as (name, lon/lat/ele array) pairs, plus its waypoints."""
+    tracks, waypoints = [], []
+    buffer = array('d')
+    for tag, element in iterparse_gpx(stream, {'wpt', 'trkpt', 'rtept', 'trk', 'rte'}):
+        if tag == 'wpt':
+            waypoints.append(waypoint_row(element, len(waypoints) + 1))
+        elif tag in ('trkpt', 'rtept'):
+            try:
+                longitude, latitude = float(element.get('lon')), float(element.get('lat'))
+                elevation = number(fields(element).get('ele'))
+            except (TypeError, ValueError):
+                continue
+            buffer.extend((longitude, latitude, elevation if elevation is not None else math.nan))
+        else:
+            name = fields(element).get('name') or f"Track {len(tracks) + 1}"
+            tracks.append((name, np.frombuffer(buffer, dtype=np.float64).reshape(-1, 3).copy()))
+            buffer = array('d')
+    return tracks, waypoints
+
+
+def read_markers(stream, filename):
+    if filename.lower().endswith('.gpx'):
+        return read_gpx_waypoints(stream)
+    return read_csv(stream)
+
+
+def geocode(rows, pool, result):
+    """Resolve rows without coordinates, from the geocode cache first and from ORS concurrently."""
+    pending = []
+    for row in rows:
+        if row.latitude is not None and row.longitude is not None:
+            continue
+        coordinates = Geocode.lookup(row.address, row.country.name)
+        if coordinates is not None:
+            row.longitude, row.latitude = coordinates
+        else:
+            pending.append(row)
+
+    futures = [pool.submit(ors_client.search, row.address + ", " + row.country.name) for row in pending]
+    for row, future in zip(pending, futures):
+        coordinates = future.result()
+        if coordinates is None:
+            result.fail(row, "Address could not be located.")
+            continue
+        row.longitude, row.latitude = coordinates
+        Geocode.store(row.address, row.country.name, coordinates)
+    return [row for row in rows if row.latitude is not None and row.longitude is not None]
+
+
+def elevate(rows, pool, workers):
+    """Fill in missing elevations, splitting the lookups across the pool."""
+    pending = [row for row in rows if row.elevation is None]
+    if not pending:
+        return
+    provider = elevation_provider()
+    size = int(math.ceil(len(pending) / workers))
+    chunks = [pending[start:start + size] for start in range(0, len(pending), size)]
+    futures = [pool.submit(provider.elevations, [(row.latitude, row.longitude) for row in chunk]) for chunk in chunks]
+    for chunk, future in zip(chunks, futures):
+        for row, elevation in zip(chunk, future.result()):
+            row.elevation = elevation
+
+
+def marker(user, row):
+    return Marker(name=row.name, address=row.address, country=row.country, folder=row.folder,
+                  latitude=row.latitude, longitude=row.longitude, elevation=row.elevation, user_id=user.id)
+
+
+def insert(user, rows, result):
+    db.session.add_all([marker(user, row) for row in rows])
+    try:
+        db.session.commit()
+        result.created += len(rows)
+        return
+    except IntegrityError:
+        db.session.rollback()
+
+    for row in rows:
+        db.session.add(marker(user, row))
+        try:
+            db.session.commit()
+            result.created += 1
+        except IntegrityError:
+            db.session.rollback()
+            result.fail(row, "Marker already exists.")
+
+
+def import_markers(user, rows, folder=None, workers=None, batch=None):
+    """Create markers for every new address, geocoding and elevating them in parallel.
+
+    Rows whose address is already known are skipped; rows that cannot be
+    resolved are reported in the result instead of aborting the import.
+    """
+    workers = workers or current_app.config['MARKERS_IMPORT_WORKERS']
+    batch = batch or current_app.config['MARKERS_IMPORT_BATCH']
+    result = ImportResult()
+
+    countries = {country.name.lower(): country for country in Country.cached_all()}
+    folders = {item.name.lower(): item for item in Folder.cached_all()}
+    default_country = Country.cached_default()
+
+    accepted = []
+    seen = set()
+    for row in rows:
+        row.country = countries.get(row.country.lower()) if row.country else default_country
+        row.folder = folders.get(row.folder.lower()) if row.folder else folder
+        if row.error:
+            result.fail(row, row.error)
+        elif not row.name or not row.address:
+            result.fail(row, "Name and address are required.")
+        elif row.country is None:
+            result.fail(row, "Unknown country.")
+        elif row.folder is None:
+            result.fail(row, "Unknown folder.")
+        elif row.address in seen:
+            result.skipped += 1
+        else:
+            seen.add(row.address)
+            accepted.append(row)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='import') as pool:
+        for start in range(0, len(accepted), batch):
+            rows = accepted[start:start + batch]
+            existing = {address for address, in db.session.query(Marker.address).filter(
+                Marker.address.in_([row.address for row in rows]))}
+            result.skipped += sum(row.address in existing for row in rows)
+            rows = geocode([row for row in rows if row.address not in existing], pool, result)
+            elevate(rows, pool, workers)
+            insert(user, rows, result)
+    return result
+
+
+def unique_value(column, value, taken):
+    """value, or value suffixed with " (n)", unused both by the column and by the values already taken."""
+    candidate, index = value, 1
+    while candidate in taken or column.class_.query.filter(column == candidate).first() is not None:
+        index += 1
+        candidate = f"{value} ({index})"
+    taken.add(candidate)
+    return candidate
+
+
+def track_route(name, points):
+    """A ready route holding a recorded track, with its totals computed locally instead of by ORS."""
+    points[:, 2] = geometry.fill_gaps(points[:, 2])
+    ascent, descent = geometry.climb(points[:, 2])
+    route = Route(name=name, geometry=geometry.pack(points), status='ready',
+                  distance=float(geometry.segment_distances(points[:, [1, 0, 2]]).sum()), ascent=ascent, descent=descent)
+    route.simplify()
+    return route
+
+
+def import_tracks(trek, stream, folder=None):
+    """Append one route per GPX track to the trek and attach its waypoints to the nearest route.
+
+    Waypoints reuse the marker already known under the same name or address.
+    Malformed points and waypoints are left out.
+    """
+    tracks, waypoints = read_gpx_tracks(stream)
+    waypoints = [row for row in waypoints if not row.error]
+    tracks = [(name, points) for name, points in tracks if len(points) > 1]
+
+    routes, names = [], set()
+    with db.session.no_autoflush:
+        for name, points in tracks:
+            routes.append(track_route(unique_value(Route.name, name, names), points))
+
+        folder = folder or min(Folder.cached_all(), key=lambda item: item.id, default=None)
+        country = Country.cached_default()
+        stops = {route: [] for route in routes}
+        for row in waypoints:
+            if not routes:
+                break
+            distances = [geometry.haversine(row.latitude, row.longitude, points[:, 1], points[:, 0])
+                         for _, points in tracks]
+            nearest = int(np.argmin([distance.min() for distance in distances]))
+            stops[routes[nearest]].append((int(np.argmin(distances[nearest])), row))
+
+        missing = [row for row in waypoints if row.elevation is None]
+        if routes and missing:
+            elevations = elevation_provider().elevations([(row.latitude, row.longitude) for row in missing])
+            for row, elevation in zip(missing, elevations):
+                row.elevation = elevation
+
+        created, marker_names, addresses = {}, set(), set()
+        for route, rows in stops.items():
+            for _, row in sorted(rows, key=lambda stop: stop[0]):
+                existing = created.get(row.name) or created.get(row.address) or Marker.query.filter(
+                    Marker.user_id == trek.user.id, (Marker.address == row.address) | (Marker.name == row.name)).first()
+                if existing is None:
+                    keys = row.name, row.address
+                    # Names and addresses are unique across users, so another user's marker may hold them.
+                    row.name = unique_value(Marker.name, row.name, marker_names)
+                    row.address = unique_value(Marker.address, row.address, addresses) if row.address else None
+                    row.country, row.folder = country, folder
+                    existing = marker(trek.user, row)
+                    created.update(dict.fromkeys(keys, existing))
+                route.markers.append(existing)
+
+    trek.routes.extend(routes)
+    db.session.commit()
+    return routes, len(set(created.values()))
@@ -0,0 +1,82 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+from flask import current_app
+
+
+from app import db
+from app.models import Route, Job
+
+
+def executor():
+    if 'jobs' not in current_app.extensions:
+        current_app.extensions['jobs'] = ThreadPoolExecutor(
+            max_workers=current_app.config['JOBS_WORKERS'], thread_name_prefix='jobs')
+    return current_app.extensions['jobs']
+
+
+def route_lock(app, route_id):
+    locks = app.extensions.setdefault('jobs_locks', {})
+    return locks.setdefault(route_id, threading.Lock())
+
+
+def enqueue(route):
+    route.status = 'pending'
+    if Job.query.filter_by(route_id=route.id).first() is None:
+        db.session.add(Job(route_id=route.id))
+        db.session.info.setdefault('jobs', set()).add(route.id)
+
+
+def process(app, route_id):
+    # One recompute per route at a time, so an older result can never be committed over a newer one.
+    with app.app_context(), route_lock(app, route_id):
+        claimed = Job.query.filter_by(route_id=route_id).delete()
+        db.session.commit()
+        if not claimed:
+            return
+
+        route = Route.query.get(route_id)
+        if route is None:
+            return
+        try:
+            updated = len(route.markers) < 2 or route.update()
+            with db.session.no_autoflush:
+                stale = Job.query.filter_by(route_id=route_id).first() is not None
+            if stale:
+                # The route changed meanwhile (possibly in another process); its own job recomputes it.
+                db.session.rollback()
+                return
+            route.status = 'ready' if updated else 'failed'
+            db.session.commit()
+        except Exception:
+            app.logger.exception(f"Route {route_id} update failed")
+            db.session.rollback()
+            Route.query.filter_by(id=route_id).update({'status': 'failed'})
+            db.session.commit()
+
+
+def run_pending():
+    app = current_app._get_current_object()
+    route_ids = [route_id for route_id, in db.session.query(Job.route_id).order_by(Job.timestamp)]
+    for route_id in route_ids:
+        process(app, route_id)
+    return len(route_ids)
+
+
+@db.event.listens_for(db.session, 'after_commit')
+def dispatch(session):
+    route_ids = session.info.pop('jobs', set())
+    if not route_ids:
+        return
+
+    app = current_app._get_current_object()
+    futures = [executor().submit(process, app, route_id) for route_id in route_ids]
+    if app.config['JOBS_EAGER']:
+        for future in futures:
+            future.result()
+
+
+@db.event.listens_for(db.session, 'after_rollback')
+def discard(session):
+    session.info.pop('jobs', None)
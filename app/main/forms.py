@@ -1,6 +1,8 @@
+from flask_login import current_user
 from flask_wtf import FlaskForm
-from wtforms import StringField, SelectField, FloatField, SubmitField
-from wtforms.validators import DataRequired
+from wtforms import StringField, SelectField, FloatField, IntegerField, SubmitField
+from wtforms.validators import DataRequired, ValidationError
+from wtforms.widgets import HiddenInput
 
 
 from app.models import Marker, Profile, Preference, Country, Folder
@@ -19,17 +21,17 @@ class TrekRouteForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(TrekRouteForm, self).__init__(*args, **kwargs)
-        self.profile.choices = [(profile.id, profile.name) for profile in Profile.query.all()]
-        self.preference.choices = [(preference.id, preference.name) for preference in Preference.query.all()]
+        self.profile.choices = Profile.choices()
+        self.preference.choices = Preference.choices()
 
 
 class TrekRouteMarkerForm(FlaskForm):
-    marker = SelectField('Marker', coerce=int)
+    marker = IntegerField('Marker', widget=HiddenInput(), validators=[DataRequired(message='Select a marker.')])
     submit = SubmitField('Submit')
 
-    def __init__(self, *args, **kwargs):
-        super(TrekRouteMarkerForm, self).__init__(*args, **kwargs)
-        self.marker.choices = [(marker.id, marker.name) for marker in Marker.query.order_by(Marker.name).all()]
+    def validate_marker(self, field):
+        if Marker.query.filter_by(id=field.data, user_id=current_user.id).first() is None:
+            raise ValidationError('Unknown marker.')
 
 
 class MarkerForm(FlaskForm):
@@ -44,6 +46,6 @@ class MarkerForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(MarkerForm, self).__init__(*args, **kwargs)
-        self.folder.choices = [(folder.id, folder.name) for folder in Folder.query.order_by(Folder.name).all()]
-        self.country.choices = [(country.id, country.name) for country in Country.query.order_by(Country.name).all()]
+        self.folder.choices = Folder.choices()
+        self.country.choices = Country.choices()
         self.mode.choices = [(1, "Address"), (2, "Coordinates")]
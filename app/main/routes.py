@@ -1,15 +1,21 @@
 import json
-from io import BytesIO
+from werkzeug.http import dump_options_header
+from werkzeug.urls import url_quote
 
 
-from flask import render_template, flash, redirect, url_for, jsonify, send_file
+from flask import render_template, flash, redirect, url_for, jsonify, current_app, g, request, Response, stream_with_context, abort
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload, selectinload
 
 
-from app import db
+from app import db, jobs
+from app.geocoding import stream_trek_as_gpx
+from app.metrics import gpx_bytes
 from app.main import bp
 from app.main.forms import TrekForm, TrekRouteForm, TrekRouteMarkerForm, MarkerForm
-from app.models import User, Trek, Route, Marker, Profile, Preference, Country, Folder
+from app.models import User, Trek, Route, RouteMarker, Marker, Profile, Preference, Country, Folder
+from app.pagination import TREK_SORTS, MARKER_SORTS, requested_page
+from app.profiling import query_budget
 
 
 
@@ -19,17 +25,39 @@ from app.models import User, Trek, Route, Marker, Profile, Preference, Country,
 #     return "${:,.2f}".format(value)
 
 
+@bp.after_app_request
+def count_geometry_decodes(response):
+    decodes = g.get('geometry_decodes', 0)
+    if decodes:
+        response.headers['X-Geometry-Decodes'] = str(decodes)
+        current_app.logger.debug(f"{request.path}: {decodes} geometry decodes")
+    return response
+
+
+def count_bytes(chunks):
+    for chunk in chunks:
+        chunk = chunk.encode('utf-8')
+        gpx_bytes.inc(amount=len(chunk))
+        yield chunk
+
+
 @bp.route('/', methods=['GET'])
 @bp.route('/index', methods=['GET'])
 @login_required
+@query_budget(2)
 def index():
-    return render_template('index.html', title='Maps', user=current_user)
+    treks, cursor, args = requested_page(Trek.query.filter_by(user_id=current_user.id), TREK_SORTS, 'position',
+                                         Trek.id, current_app.config['MAPS_PER_PAGE'])
+    return render_template('index.html', title='Maps', user=current_user, treks=treks, cursor=cursor, args=args)
 
 
 @bp.route('/treks', methods=['GET'])
 @login_required
+@query_budget(2)
 def treks():
-    return render_template('treks.html', title='Treks', user=current_user)
+    treks, cursor, args = requested_page(Trek.query.filter_by(user_id=current_user.id), TREK_SORTS, 'position',
+                                         Trek.id, current_app.config['TREKS_PER_PAGE'])
+    return render_template('treks.html', title='Treks', user=current_user, treks=treks, cursor=cursor, args=args)
 
 
 @bp.route('/trek/add', methods=['GET', 'POST'])
@@ -77,8 +105,13 @@ def delete_trek(trek_id):
 
 @bp.route('/trek/<int:trek_id>/routes', methods=['GET'])
 @login_required
+@query_budget(4)
 def trek_routes(trek_id):
-    trek = Trek.query.filter_by(id=trek_id).one()
+    trek = Trek.query.filter_by(id=trek_id).options(
+        joinedload(Trek.user),
+        selectinload(Trek.routes).joinedload(Route.profile),
+        selectinload(Trek.routes).joinedload(Route.preference),
+        selectinload(Trek.routes).selectinload(Route.route_markers)).one()
     return render_template('trek_routes.html', title='Routes', trek=trek)
 
 
@@ -86,14 +119,12 @@ def trek_routes(trek_id):
 @login_required
 def add_trek_route(trek_id):
     form = TrekRouteForm()
-    default_profile = Profile.query.filter_by(default=1).one()
-    default_preference = Preference.query.filter_by(default=1).one()
-    form.profile.data = default_profile.id
-    form.profile.data = default_preference.id
+    form.profile.data = Profile.cached_default().id
+    form.preference.data = Preference.cached_default().id
     if form.validate_on_submit():
         name = form.name.data
-        profile = Profile.query.get(form.profile.data)
-        preference = Preference.query.get(form.preference.data)
+        profile = Profile.cached(form.profile.data)
+        preference = Preference.cached(form.preference.data)
         trek = Trek.query.filter_by(id=trek_id).one()
         trek.routes.append(Route(name=name, profile=profile, preference=preference))
         db.session.commit()
@@ -112,13 +143,13 @@ def edit_trek_route(trek_id, route_id):
     route = Route.query.filter_by(id=route_id).one()
     if form.validate_on_submit():
         route.name = form.name.data
-        profile = Profile.query.get(form.profile.data)
-        preference = Preference.query.get(form.preference.data)
+        profile = Profile.cached(form.profile.data)
+        preference = Preference.cached(form.preference.data)
         if route.profile.id != profile.id or route.preference.id != preference.id:
             route.profile = profile
             route.preference = preference
             if len(route.markers) > 1:
-                route.update()
+                jobs.enqueue(route)
         db.session.commit()
         flash('Route has been updated.')
         return jsonify(status='ok')
@@ -158,7 +189,7 @@ def add_trek_route_marker(trek_id, route_id):
         marker = Marker.query.get(form.marker.data)
         route.markers.append(marker)
         if len(route.markers) > 1:
-            route.update()
+            jobs.enqueue(route)
         db.session.commit()
         flash('Marker has been added.')
         return jsonify(status='ok')
@@ -175,9 +206,8 @@ def delete_trek_route_marker(trek_id, route_id, marker_id, show_all):
     for marker in route.markers:
         if marker.id == marker_id:
             route.markers.remove(marker)
-    db.session.commit()
     if len(route.markers) > 1:
-        route.update()
+        jobs.enqueue(route)
     db.session.commit()
     flash('Marker has been deleted.')
     if show_all:
@@ -187,34 +217,50 @@ def delete_trek_route_marker(trek_id, route_id, marker_id, show_all):
 
 @bp.route('/trek/<int:trek_id>/markers', methods=['GET'])
 @login_required
+@query_budget(4)
 def trek_markers(trek_id):
-    trek = Trek.query.filter_by(id=trek_id).one()
+    trek = Trek.query.filter_by(id=trek_id).options(
+        joinedload(Trek.user),
+        selectinload(Trek.routes).selectinload(Route.route_markers)
+        .joinedload(RouteMarker.marker).joinedload(Marker.country)).one()
     return render_template('trek_markers.html', title='Markers', trek=trek)
 
 
 @bp.route('/markers', methods=['GET'])
 @login_required
 def markers():
-    folders = Folder.query.order_by(Folder.name).all()
-    return render_template('markers.html', title='Markers', user=current_user, folders=folders)
+    folder_id = request.args.get('folder', type=int)
+    if folder_id is None:
+        folders = Folder.cached_all()
+    else:
+        folders = [Folder.cached(folder_id) or abort(404)]
+
+    pages, args = [], {}
+    for folder in folders:
+        query = Marker.query.filter_by(folder_id=folder.id, user_id=current_user.id).options(joinedload(Marker.country))
+        markers, cursor, args = requested_page(query, MARKER_SORTS, 'name', Marker.id,
+                                               current_app.config['MARKERS_PER_PAGE'], paged=folder_id is not None)
+        pages.append((folder, markers, cursor))
+    return render_template('markers.html', title='Markers', user=current_user, pages=pages, folder_id=folder_id,
+                           args=args)
 
 
 @bp.route('/marker/add', methods=['GET', 'POST'])
 @login_required
 def add_marker():
     form = MarkerForm()
-    default_country = Country.query.filter_by(default=1).one()
-    form.country.data = default_country.id
+    form.country.data = Country.cached_default().id
     if form.validate_on_submit():
         name = form.name.data
         mode = form.mode.data
         address = form.address.data
-        country = Country.query.get(form.country.data)
-        folder = Folder.query.get(form.folder.data)
+        country = Country.cached(form.country.data)
+        folder = Folder.cached(form.folder.data)
         # latitude = form.latitude.data
         # longitude = form.longitude.data
         marker = Marker(folder=folder, name=name, country=country, address=address)
-        marker.update()
+        if not marker.update():
+            return jsonify(json.dumps({'address': ['Address could not be located.']}))
         current_user.markers.append(marker)
         db.session.commit()
         flash('Marker has been added.')
@@ -233,9 +279,10 @@ def edit_marker(marker_id):
     if form.validate_on_submit():        
         marker.name = form.name.data
         marker.address = form.address.data
-        marker.country = Country.query.get(form.country.data)
-        marker.folder = Folder.query.get(form.folder.data)
-        marker.update()
+        marker.country = Country.cached(form.country.data)
+        marker.folder = Folder.cached(form.folder.data)
+        if not marker.update():
+            return jsonify(json.dumps({'address': ['Address could not be located.']}))
         db.session.commit()
         flash('Marker has been updated.')
         return jsonify(status='ok')
@@ -265,7 +312,8 @@ def delete_marker(marker_id):
 def get_file(trek_id):
     trek = Trek.query.filter_by(id=trek_id).one()
     gpx_filename = trek.name + ".gpx"
-    gpx_file = BytesIO()
-    gpx_file.write(str(trek.gpx()).encode('utf-8'))
-    gpx_file.seek(0)
-    return send_file(gpx_file, mimetype="application/gpx+xml", attachment_filename=gpx_filename, as_attachment=True)
+    disposition = dump_options_header('attachment', {
+        'filename': gpx_filename.encode('ascii', 'ignore').decode('ascii'),
+        'filename*': "UTF-8''" + url_quote(gpx_filename, safe='')})
+    return Response(stream_with_context(count_bytes(stream_trek_as_gpx(trek))), mimetype="application/gpx+xml",
+                    headers={'Content-Disposition': disposition})
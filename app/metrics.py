@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+
+
+from flask import current_app, request, g, Response
+
+
+from app import db
+from app.cache import registry as caches
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+registry = []
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.values = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self.values.get(labels, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self.values.items()]
+
+    def reset(self):
+        with self._lock:
+            self.values.clear()
+
+    def __repr__(self):
+        return f"<Counter {self.name}, Series {len(self.values)}>"
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            counts, total, count = self.values.get(labels, ([0] * (len(self.buckets) + 1), 0.0, 0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self.values[labels] = counts, total + value, count + 1
+
+    def count(self, *labels):
+        return self.values.get(labels, (None, 0.0, 0))[2]
+
+    def sum(self, *labels):
+        return self.values.get(labels, (None, 0.0, 0))[1]
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), [list(counts), total, count]] for labels, (counts, total, count) in self.values.items()]
+
+    def reset(self):
+        with self._lock:
+            self.values.clear()
+
+    def __repr__(self):
+        return f"<Histogram {self.name}, Series {len(self.values)}>"
+
+
+ors_requests = Counter('ors_requests_total', 'ORS HTTP requests', ['operation', 'status'])
+ors_latency = Histogram('ors_request_seconds', 'ORS HTTP request latency', ['operation'])
+ors_failures = Counter('ors_failures_total', 'ORS calls given up after retries', ['operation'])
+http_latency = Histogram('http_request_seconds', 'Request latency', ['endpoint', 'method', 'status'])
+gpx_bytes = Counter('gpx_export_bytes_total', 'GPX export bytes served')
+
+
+def pool_usage():
+    pool = db.engine.pool
+    usage = {}
+    for name in ('size', 'checkedout', 'overflow'):
+        if hasattr(pool, name):
+            usage[name] = getattr(pool, name)()
+    return usage
+
+
+def snapshot():
+    """Current values of this process, in a JSON-friendly form that merge() can sum across processes."""
+    return {
+        "metrics": {metric.name: metric.snapshot() for metric in registry},
+        "caches": {stats.name: [stats.hits, stats.misses] for stats in caches},
+        "pool": pool_usage(),
+    }
+
+
+def merge(snapshots):
+    """Sum of the counters and histograms of the snapshots; the pool gauges are those of the first one only."""
+    merged = {"metrics": {}, "caches": {}, "pool": dict(snapshots[0]["pool"]) if snapshots else {}}
+    for data in snapshots:
+        for name, series in data["metrics"].items():
+            values = merged["metrics"].setdefault(name, {})
+            for labels, value in series:
+                key = tuple(labels)
+                if key not in values:
+                    values[key] = value
+                elif isinstance(value, list):
+                    counts, total, count = values[key]
+                    values[key] = [[a + b for a, b in zip(counts, value[0])], total + value[1], count + value[2]]
+                else:
+                    values[key] += value
+        for name, (hits, misses) in data["caches"].items():
+            previous = merged["caches"].get(name, (0, 0))
+            merged["caches"][name] = (previous[0] + hits, previous[1] + misses)
+    return merged
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def series(name, names, labels, value, extra=()):
+    pairs = [f'{label}="{escape(v)}"' for label, v in list(zip(names, labels)) + list(extra)]
+    return f"{name}{{{','.join(pairs)}}} {value}" if pairs else f"{name} {value}"
+
+
+def render(merged):
+    """Prometheus text exposition (version 0.0.4) of merged snapshots."""
+    lines = []
+    for metric in registry:
+        lines += [f"# HELP {metric.name} {metric.description}", f"# TYPE {metric.name} {metric.type}"]
+        values = merged["metrics"].get(metric.name) or ({(): 0} if metric.type == 'counter' and not metric.labels else {})
+        for labels, value in sorted(values.items()):
+            if metric.type == 'counter':
+                lines.append(series(metric.name, metric.labels, labels, value))
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket in zip(metric.buckets + ('+Inf',), counts):
+                cumulative += bucket
+                lines.append(series(f"{metric.name}_bucket", metric.labels, labels, cumulative, [('le', bound)]))
+            lines.append(series(f"{metric.name}_sum", metric.labels, labels, total))
+            lines.append(series(f"{metric.name}_count", metric.labels, labels, count))
+
+    lines += ["# HELP cache_requests_total Cache lookups", "# TYPE cache_requests_total counter"]
+    for name, (hits, misses) in sorted(merged["caches"].items()):
+        lines.append(series("cache_requests_total", ('cache', 'result'), (name, 'hit'), hits))
+        lines.append(series("cache_requests_total", ('cache', 'result'), (name, 'miss'), misses))
+    lines += ["# HELP cache_hit_ratio Share of cache lookups served from the cache", "# TYPE cache_hit_ratio gauge"]
+    for name, (hits, misses) in sorted(merged["caches"].items()):
+        lines.append(series("cache_hit_ratio", ('cache',), (name,), hits / (hits + misses) if hits + misses else 0.0))
+
+    for name, value in sorted(merged["pool"].items()):
+        lines += [f"# HELP db_pool_{name} Database connection pool {name} of the serving process",
+                  f"# TYPE db_pool_{name} gauge",
+                  f"db_pool_{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def process_file(directory, pid=None):
+    return os.path.join(directory, f"{pid or os.getpid()}.json")
+
+
+def flush(directory):
+    """Publish this process's values for the other workers serving /metrics."""
+    os.makedirs(directory, exist_ok=True)
+    path = process_file(directory)
+    with open(path + '.tmp', 'w', encoding='utf-8') as stream:
+        json.dump(snapshot(), stream)
+    os.replace(path + '.tmp', path)
+
+
+def running(pid):
+    if os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect(directory=None, max_age=None):
+    """Merged values of this process and of the other processes flushed to directory.
+
+    Snapshots of processes that are gone, or not refreshed for max_age seconds, are deleted instead.
+    """
+    snapshots = [snapshot()]
+    if directory and os.path.isdir(directory):
+        own = process_file(directory)
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith('.json') and path != own:
+                try:
+                    if (max_age is not None and time.time() - os.path.getmtime(path) > max_age
+                            or not running(int(name[:-len('.json')]))):
+                        os.remove(path)
+                        continue
+                    with open(path, encoding='utf-8') as stream:
+                        snapshots.append(json.load(stream))
+                except (OSError, ValueError):
+                    continue
+    return merge(snapshots)
+
+
+def start_timer():
+    g.metrics_start = time.perf_counter()
+
+
+def observe_request(response):
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        http_latency.observe(time.perf_counter() - start, request.endpoint or 'unknown', request.method,
+                             str(response.status_code))
+
+    directory = current_app.config['METRICS_DIRECTORY']
+    state = current_app.extensions['metrics']
+    if directory and time.monotonic() - state['flushed'] >= current_app.config['METRICS_FLUSH_INTERVAL']:
+        state['flushed'] = time.monotonic()
+        flush(directory)
+    return response
+
+
+def metrics():
+    merged = collect(current_app.config['METRICS_DIRECTORY'], current_app.config['METRICS_STALE_AFTER'])
+    return Response(render(merged), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_app(app):
+    app.extensions['metrics'] = {'flushed': 0.0}
+    app.before_request(start_timer)
+    app.after_request(observe_request)
+    app.add_url_rule('/metrics', 'metrics', metrics)
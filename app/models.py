@@ -1,13 +1,21 @@
-from datetime import datetime
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
 
 
+import numpy as np
+from flask import current_app, g, has_app_context
 from flask_login import UserMixin
 from sqlalchemy.ext.orderinglist import ordering_list
 from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.orm import make_transient_to_detached
 
 
-from app import db, login_manager
+from app import db, login_manager, geometry
+from app.cache import geocode_stats, directions_stats, reference_stats, create_backend, VersionedCache
+from app.elevation import elevation_provider
 from app.geocoding import ors_client, ors_profile, ors_preference, export_trek_as_gpx
 
 
@@ -49,12 +57,25 @@ def load_user(id):
 
 class Trek(db.Model):
     __tablename__ = 'trek'
+    __table_args__ = (
+        db.Index('ix_trek_user_position', 'user_id', 'position'),
+        db.Index('ix_trek_user_name', 'user_id', 'name'),
+        db.Index('ix_trek_user_distance', 'user_id', 'total_distance'),
+        db.Index('ix_trek_user_timestamp', 'user_id', 'timestamp'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), unique=True)
     position = db.Column(db.Integer)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+    total_distance = db.Column(db.Float, default=0)
+    total_ascent = db.Column(db.Float, default=0)
+    total_descent = db.Column(db.Float, default=0)
+    routes_count = db.Column(db.Integer, default=0)
+    markers_count = db.Column(db.Integer, default=0)
+    profile_sample = db.Column(db.LargeBinary)
+
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
 
     routes = db.relationship('Route',
@@ -67,40 +88,58 @@ class Trek(db.Model):
         super(Trek, self).__init__(**kwargs)
 
     def distance(self):
-        return sum(route.distance for route in self.routes if route.distance is not None)
+        return self.total_distance or 0
 
     def ascent(self):
-        return sum(route.ascent for route in self.routes if route.ascent is not None)
+        return self.total_ascent or 0
 
     def descent(self):
-        return sum(route.descent for route in self.routes if route.descent is not None)
+        return self.total_descent or 0
 
     def nb_routes(self):
-        return len(self.routes)
+        return self.routes_count or 0
 
     def nb_markers(self):
-        return sum(len(route.markers) for route in self.routes)
+        return self.markers_count or 0
+
+    def aggregate(self, deleted=(), resample=True):
+        routes = [route for route in dict.fromkeys(self.routes) if route not in deleted]
+        self.total_distance = sum(route.distance for route in routes if route.distance is not None)
+        self.total_ascent = sum(route.ascent for route in routes if route.ascent is not None)
+        self.total_descent = sum(route.descent for route in routes if route.descent is not None)
+        self.routes_count = len(routes)
+        self.markers_count = sum(
+            len([route_marker for route_marker in route.route_markers if route_marker not in deleted]) for route in routes)
+        if resample:
+            self.profile_sample = Trek.sample(routes)
 
-    def elevation_profile(self):
-        coordinates = []
-        for route in self.routes:
-            coordinates.extend(route.coordinates())
+    @staticmethod
+    def sample(routes):
+        points = [route.points() for route in routes]
+        points = [route for route in points if len(route)]
+
+        if len(points) == 0:
+            return None
+
+        x, y = geometry.elevation_profile(np.concatenate(points)[:, [1, 0, 2]])
+        indices = geometry.lttb(x, y, current_app.config['ELEVATION_PROFILE_POINTS'])
+        return geometry.pack(np.column_stack([x[indices], y[indices]]))
 
-        if len(coordinates) == 0:
+    def sampled_profile(self):
+        blob = self.profile_sample if self.profile_sample is not None else Trek.sample(self.routes)
+        if blob is None:
             return None
+        return [{"x": d, "y": e} for d, e in geometry.unpack(blob, columns=2).astype(np.float64).round(3).tolist()]
 
-        d = 0
-        p = []
-        p.append({"x": d, "y": coordinates[0][2]})
-        
-        for i in range(1, len(coordinates)):
-            d += ors_client.haversine(
-                [coordinates[i-1][0], coordinates[i-1][1]],
-                [coordinates[i][0], coordinates[i][1]])
-            p.append({"x": d/1000, "y": coordinates[i][2]})
+    def elevation_profile(self):
+        points = [route.points() for route in self.routes]
+        points = [route for route in points if len(route)]
 
-        return p
+        if len(points) == 0:
+            return None
 
+        x, y = geometry.elevation_profile(np.concatenate(points)[:, [1, 0, 2]])
+        return [{"x": d, "y": e} for d, e in zip(x.tolist(), y.tolist())]
 
     def gpx(self):
         return export_trek_as_gpx(self)
@@ -114,11 +153,12 @@ class Route(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), unique=True)
-    path = db.Column(db.String(8192))
+    geometry = db.Column(db.LargeBinary)
     distance = db.Column(db.Float)
     ascent = db.Column(db.Float)
     descent = db.Column(db.Float)
     position = db.Column(db.Integer)
+    status = db.Column(db.String(16), default='ready')
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
     trek_id = db.Column(db.Integer, db.ForeignKey('trek.id'))
@@ -134,19 +174,108 @@ class Route(db.Model):
     markers = association_proxy('route_markers', 'marker',
         creator=lambda m: RouteMarker(marker=m))
 
+    levels = db.relationship('RouteLevel',
+        order_by='RouteLevel.tolerance',
+        backref='route',
+        cascade='all, delete-orphan')
+
     def __init__(self, **kwargs):
         super(Route, self).__init__(**kwargs)
         if self.profile is None:
-            self.profile = Profile.query.filter_by(default=True).first()
+            self.profile = Profile.cached_default()
         if self.preference is None:
-            self.preference = Preference.query.filter_by(default=True).first()
+            self.preference = Preference.cached_default()
+
+    def points(self):
+        if not has_app_context() or self.id is None:
+            return decode_geometry(self.geometry)
+
+        # Least recently used first, bounded so that CLI loops over every route keep flat memory.
+        geometries = g.setdefault('geometries', OrderedDict())
+        key = (self.id, self.timestamp)
+        if key in geometries:
+            geometries.move_to_end(key)
+        else:
+            geometries[key] = decode_geometry(self.geometry)
+            while len(geometries) > current_app.config['ROUTE_GEOMETRY_MEMO_SIZE']:
+                geometries.popitem(last=False)
+        return geometries[key]
 
     def coordinates(self):
-        return [[marker[1], marker[0], marker[2]] for marker in ors_client.decode_geometry(self.path)]
+        return geometry.latlon(self.points()).tolist()
+
+    def simplify(self):
+        points = self.points()
+        levels = []
+        for tolerance in current_app.config['ROUTE_LOD_TOLERANCES']:
+            simplified = geometry.simplify(points, tolerance)
+            if len(simplified) < len(points):
+                levels.append(RouteLevel(tolerance=tolerance, size=len(simplified), geometry=geometry.pack(simplified)))
+        self.levels = levels
+
+    def level(self, zoom):
+        tolerance = geometry.zoom_tolerance(zoom)
+        levels = [level for level in self.levels if level.tolerance <= tolerance]
+        return levels[-1] if levels else None
+
+    def level_points(self, zoom=None):
+        level = self.level(zoom) if zoom is not None else None
+        return level.points() if level is not None else self.points()
 
     def update(self):
-        self.path, self.distance, self.ascent, self.descent = ors_client.directions(
-            self.markers, ors_profile[self.profile.name], ors_preference[self.preference.name])
+        value = Direction.search(self.markers, ors_profile[self.profile.name], ors_preference[self.preference.name])
+        if value is None:
+            return False
+        self.geometry, self.distance, self.ascent, self.descent = value
+        self.timestamp = datetime.utcnow()
+        self.simplify()
+        return True
+
+    @staticmethod
+    def corridor(query, latitude, longitude, radius):
+        """(route, distance, along) for the routes of query passing within radius metres, closest first.
+
+        along is the distance in metres from the start of the route to its closest approach.
+        """
+        if db.engine.dialect.name == 'sqlite':
+            south, west, north, east = geometry.radius_box(latitude, longitude, radius)
+            boxes = [db.select(route_segment_index).where(
+                route_segment_index.c.max_latitude >= south, route_segment_index.c.min_latitude <= north,
+                route_segment_index.c.max_longitude >= low, route_segment_index.c.min_longitude <= high)
+                for low, high in geometry.longitude_ranges(west, east)]
+            segments = [row._mapping for row in db.session.execute(boxes[0] if len(boxes) == 1 else db.union(*boxes))]
+            routes = {route.id: route for route in query.filter(
+                Route.id.in_({segment['route_id'] for segment in segments}))} if segments else {}
+        else:
+            routes = {route.id: route for route in query.filter(Route.geometry.isnot(None))}
+            segments = [segment for route in routes.values() for segment in route_segments(route.id, route.points())]
+
+        values = np.array([[segment[column] for column in SEGMENT_COLUMNS]
+                           for segment in segments if segment['route_id'] in routes], dtype=np.float64)
+        if not len(values):
+            return []
+        route_ids, starts, latitude1, longitude1, latitude2, longitude2 = values.T
+        distances, fractions = geometry.approach(latitude, longitude, latitude1, longitude1, latitude2, longitude2)
+        along = starts + fractions * geometry.haversine(latitude1, longitude1, latitude2, longitude2)
+
+        found = {}
+        for i in np.argsort(distances, kind='stable'):
+            if distances[i] > radius:
+                break
+            found.setdefault(int(route_ids[i]), (routes[int(route_ids[i])], float(distances[i]), float(along[i])))
+        return list(found.values())
+
+    @staticmethod
+    def reindex():
+        """Rebuild the R*Tree index of route segments from the route table."""
+        if db.engine.dialect.name != 'sqlite':
+            return
+        db.session.execute(db.text(ROUTE_SEGMENT_INDEX_DDL))
+        db.session.execute(route_segment_index.delete())
+        for route in Route.query.filter(Route.geometry.isnot(None)):
+            segments = route_segments(route.id, geometry.unpack(route.geometry))
+            if segments:
+                db.session.execute(route_segment_index.insert(), segments)
 
     def nb_markers(self):
         return len(self.markers)
@@ -155,11 +284,183 @@ class Route(db.Model):
         return f"<Name {self.name}, Markers {len(self.markers)}>"
 
 
+class Job(db.Model):
+    __tablename__ = 'job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    route_id = db.Column(db.Integer, db.ForeignKey('route.id', ondelete='CASCADE'), unique=True)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<Job {self.id}, Route {self.route_id}>"
+
+
+class RouteLevel(db.Model):
+    __tablename__ = 'route_level'
+
+    id = db.Column(db.Integer, primary_key=True)
+    tolerance = db.Column(db.Float)
+    size = db.Column(db.Integer)
+    geometry = db.Column(db.LargeBinary)
+
+    route_id = db.Column(db.Integer, db.ForeignKey('route.id'), index=True)
+
+    def points(self):
+        return geometry.unpack(self.geometry)
+
+    def __repr__(self):
+        return f"<RouteLevel {self.route_id}, Tolerance {self.tolerance}, Size {self.size}>"
+
+
+def decode_geometry(blob):
+    if has_app_context():
+        g.geometry_decodes = g.get('geometry_decodes', 0) + 1
+    return geometry.unpack(blob)
+
+
+@db.event.listens_for(Route.geometry, 'set')
+def invalidate_geometry(route, value, oldvalue, initiator):
+    if has_app_context() and route.id is not None:
+        geometries = g.get('geometries', {})
+        for key in [key for key in geometries if key[0] == route.id]:
+            del geometries[key]
+
+
+SEGMENT_COLUMNS = ('route_id', 'start', 'latitude1', 'longitude1', 'latitude2', 'longitude2')
+
+# Segment ids are route_id * ROUTE_SEGMENT_STRIDE + position, so that the segments of a route can be
+# dropped through rowid lookups. Auxiliary (+) columns need SQLite 3.24.
+ROUTE_SEGMENT_STRIDE = 2 ** 24
+
+route_segment_index = db.table('route_segment_index',
+    db.column('id'), db.column('min_latitude'), db.column('max_latitude'),
+    db.column('min_longitude'), db.column('max_longitude'), *[db.column(column) for column in SEGMENT_COLUMNS])
+
+ROUTE_SEGMENT_INDEX_DDL = ("CREATE VIRTUAL TABLE IF NOT EXISTS route_segment_index "
+                           "USING rtree(id, min_latitude, max_latitude, min_longitude, max_longitude, "
+                           "+route_id, +start, +latitude1, +longitude1, +latitude2, +longitude2)")
+
+db.event.listen(Route.__table__, 'after_create', db.DDL(ROUTE_SEGMENT_INDEX_DDL).execute_if(dialect='sqlite'))
+db.event.listen(Route.__table__, 'before_drop', db.DDL(
+    "DROP TABLE IF EXISTS route_segment_index").execute_if(dialect='sqlite'))
+
+
+def route_segments(route_id, points):
+    """Index rows for the segments of a route, with the distance along the route at which each one starts."""
+    if len(points) < 2:
+        return []
+    latitudes, longitudes = points[:, 1].astype(np.float64), points[:, 0].astype(np.float64)
+    starts = geometry.cumulative_distances(np.column_stack([latitudes, longitudes]))
+    first = route_id * ROUTE_SEGMENT_STRIDE
+    latitudes, longitudes, starts = latitudes.tolist(), longitudes.tolist(), starts.tolist()
+    return [{
+        "id": first + i,
+        "min_latitude": min(latitudes[i], latitudes[i + 1]),
+        "max_latitude": max(latitudes[i], latitudes[i + 1]),
+        "min_longitude": min(longitudes[i], longitudes[i + 1]),
+        "max_longitude": max(longitudes[i], longitudes[i + 1]),
+        "route_id": route_id,
+        "start": starts[i],
+        "latitude1": latitudes[i],
+        "longitude1": longitudes[i],
+        "latitude2": latitudes[i + 1],
+        "longitude2": longitudes[i + 1],
+    } for i in range(len(latitudes) - 1)]
+
+
+def drop_route_segments(connection, route_id, chunk=500):
+    first = route_id * ROUTE_SEGMENT_STRIDE
+    while True:
+        ids = list(range(first, first + chunk))
+        if connection.execute(route_segment_index.delete().where(route_segment_index.c.id.in_(ids))).rowcount < chunk:
+            return
+        first += chunk
+
+
+@db.event.listens_for(Route, 'after_insert')
+@db.event.listens_for(Route, 'after_update')
+def index_route(mapper, connection, route):
+    if connection.dialect.name != 'sqlite' or not db.inspect(route).attrs.geometry.history.has_changes():
+        return
+    drop_route_segments(connection, route.id)
+    segments = route_segments(route.id, geometry.unpack(route.geometry))
+    if segments:
+        connection.execute(route_segment_index.insert(), segments)
+
+
+@db.event.listens_for(Route, 'after_delete')
+def unindex_route(mapper, connection, route):
+    if connection.dialect.name == 'sqlite':
+        drop_route_segments(connection, route.id)
+
+
+class Direction(db.Model):
+    __tablename__ = 'direction'
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), index=True, unique=True)
+    geometry = db.Column(db.LargeBinary)
+    distance = db.Column(db.Float)
+    ascent = db.Column(db.Float)
+    descent = db.Column(db.Float)
+    accessed = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    @staticmethod
+    def digest(locations, profile, preference):
+        coordinates = ";".join(f"{location.longitude:.6f},{location.latitude:.6f}" for location in locations)
+        return hashlib.sha256(f"{profile}|{preference}|{coordinates}".encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def backend():
+        if 'directions' not in current_app.extensions:
+            current_app.extensions['directions'] = create_backend(
+                current_app.config['DIRECTIONS_CACHE_BACKEND'], current_app.config['DIRECTIONS_CACHE_SIZE'], Direction)
+        return current_app.extensions['directions']
+
+    @staticmethod
+    def search(locations, profile, preference):
+        locations = list(locations)
+        key = Direction.digest(locations, profile, preference)
+        backend = Direction.backend()
+
+        value = backend.get(key)
+        if value is not None:
+            directions_stats.hit()
+            return value
+
+        directions_stats.miss()
+        value = ors_client.directions(locations, profile, preference)
+        if value is None:
+            return None
+
+        path, distance, ascent, descent = value
+        value = geometry.pack(ors_client.decode_geometry(path)), distance, ascent, descent
+        backend.set(key, value)
+        return value
+
+    def value(self):
+        return self.geometry, self.distance, self.ascent, self.descent
+
+    def assign(self, value):
+        self.geometry, self.distance, self.ascent, self.descent = value
+
+    def __repr__(self):
+        return f"<Direction {self.key}, Distance {self.distance}>"
+
+
 class Marker(db.Model):
     __tablename__ = 'marker'
+    __table_args__ = (
+        db.Index('ix_marker_user_search_name', 'user_id', 'search_name'),
+        db.Index('ix_marker_user_name', 'user_id', 'name'),
+        db.Index('ix_marker_user_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_marker_folder_name', 'folder_id', 'user_id', 'name'),
+        db.Index('ix_marker_folder_timestamp', 'folder_id', 'user_id', 'timestamp'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), unique=True)
+    search_name = db.Column(db.String(64))
     address = db.Column(db.String(128), unique=True)
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
@@ -174,14 +475,179 @@ class Marker(db.Model):
         cascade="all, delete-orphan",
         backref='marker')
 
-    def update(self):
-        self.longitude, self.latitude = ors_client.search(self.address + ", " + self.country.name)
-        self.elevation = ors_client.elevation(self.latitude, self.longitude)
+    def update(self, refresh=False):
+        coordinates = Geocode.search(self.address, self.country.name, refresh=refresh)
+        if coordinates is None:
+            return False
+        self.longitude, self.latitude = coordinates
+        self.elevation = elevation_provider().elevation(self.latitude, self.longitude)
+        self.timestamp = datetime.utcnow()
+        return True
+
+    @staticmethod
+    def normalize(name):
+        """Case and accent insensitive form of name, used for prefix searches."""
+        decomposed = unicodedata.normalize('NFKD', name or '')
+        return " ".join("".join(c for c in decomposed if not unicodedata.combining(c)).casefold().split())
+
+    @staticmethod
+    def search(query, text, page=1, per_page=20):
+        """One page of the markers of query whose name starts with text, and whether more pages follow."""
+        prefix = Marker.normalize(text)
+        if prefix:
+            query = query.filter(Marker.search_name >= prefix, Marker.search_name < prefix + '\U0010ffff')
+        markers = query.order_by(Marker.search_name, Marker.id).offset((page - 1) * per_page).limit(per_page + 1).all()
+        return markers[:per_page], len(markers) > per_page
+
+    @staticmethod
+    def within(query, south, west, north, east):
+        """Restrict query to markers inside the box, through the R*Tree index on SQLite."""
+        ranges = geometry.longitude_ranges(west, east)
+        query = query.filter(Marker.latitude.between(south, north), db.or_(
+            *[Marker.longitude.between(low, high) for low, high in ranges]))
+        if db.engine.dialect.name != 'sqlite':
+            return query
+        boxes = [db.select(marker_index.c.id).where(
+            marker_index.c.max_latitude >= south, marker_index.c.min_latitude <= north,
+            marker_index.c.max_longitude >= low, marker_index.c.min_longitude <= high) for low, high in ranges]
+        return query.filter(Marker.id.in_(boxes[0] if len(boxes) == 1 else db.union(*boxes)))
+
+    @staticmethod
+    def reindex():
+        """Rebuild the R*Tree index from the marker table."""
+        if db.engine.dialect.name != 'sqlite':
+            return
+        db.session.execute(db.text(MARKER_INDEX_DDL))
+        db.session.execute(marker_index.delete())
+        db.session.execute(db.text(
+            "INSERT INTO marker_index SELECT id, latitude, latitude, longitude, longitude FROM marker "
+            "WHERE latitude IS NOT NULL AND longitude IS NOT NULL"))
+
+    @staticmethod
+    def near(query, latitude, longitude, radius):
+        """(marker, distance) pairs within radius metres, closest first."""
+        markers = Marker.within(query, *geometry.radius_box(latitude, longitude, radius)).all()
+        if not markers:
+            return []
+        distances = geometry.haversine(latitude, longitude, np.array([marker.latitude for marker in markers]),
+                                       np.array([marker.longitude for marker in markers]))
+        order = np.argsort(distances, kind='stable')
+        return [(markers[i], float(distances[i])) for i in order if distances[i] <= radius]
+
+    @staticmethod
+    def nearest(query, latitude, longitude, count, radius=1000.0):
+        """The count closest markers, widening the search circle until it holds enough of them."""
+        while True:
+            found = Marker.near(query, latitude, longitude, radius)
+            if len(found) >= count or radius >= np.pi * geometry.EARTH_RADIUS:
+                return found[:count]
+            radius *= 4
 
     def __repr__(self):
         return f"<Marker {self.name}, Latitude {self.latitude}, Longitude {self.longitude}, Elevation {self.elevation}>"
 
 
+@db.event.listens_for(Marker.name, 'set')
+def normalize_marker_name(marker, value, oldvalue, initiator):
+    marker.search_name = Marker.normalize(value)
+
+
+marker_index = db.table('marker_index',
+    db.column('id'), db.column('min_latitude'), db.column('max_latitude'),
+    db.column('min_longitude'), db.column('max_longitude'))
+
+MARKER_INDEX_DDL = ("CREATE VIRTUAL TABLE IF NOT EXISTS marker_index "
+                    "USING rtree(id, min_latitude, max_latitude, min_longitude, max_longitude)")
+
+db.event.listen(Marker.__table__, 'after_create', db.DDL(MARKER_INDEX_DDL).execute_if(dialect='sqlite'))
+db.event.listen(Marker.__table__, 'before_drop', db.DDL(
+    "DROP TABLE IF EXISTS marker_index").execute_if(dialect='sqlite'))
+
+
+@db.event.listens_for(Marker, 'after_insert')
+@db.event.listens_for(Marker, 'after_update')
+def index_marker(mapper, connection, marker):
+    if connection.dialect.name != 'sqlite':
+        return
+    state = db.inspect(marker)
+    if not (state.attrs.latitude.history.has_changes() or state.attrs.longitude.history.has_changes()):
+        return
+    connection.execute(marker_index.delete().where(marker_index.c.id == marker.id))
+    if marker.latitude is not None and marker.longitude is not None:
+        connection.execute(marker_index.insert().values(
+            id=marker.id, min_latitude=marker.latitude, max_latitude=marker.latitude,
+            min_longitude=marker.longitude, max_longitude=marker.longitude))
+
+
+@db.event.listens_for(Marker, 'after_delete')
+def unindex_marker(mapper, connection, marker):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(marker_index.delete().where(marker_index.c.id == marker.id))
+
+
+class Geocode(db.Model):
+    __tablename__ = 'geocode'
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(256), index=True, unique=True)
+    longitude = db.Column(db.Float)
+    latitude = db.Column(db.Float)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    @staticmethod
+    def normalize(address, country):
+        return "|".join(" ".join(value.lower().split()) for value in (address, country))
+
+    @staticmethod
+    def lookup(address, country, refresh=False):
+        geocode = Geocode.query.filter_by(key=Geocode.normalize(address, country)).first()
+
+        bypass = refresh or current_app.config['GEOCODE_CACHE_BYPASS']
+        ttl = timedelta(seconds=current_app.config['GEOCODE_CACHE_TTL'])
+        if geocode is not None and not bypass and datetime.utcnow() - geocode.timestamp < ttl:
+            geocode_stats.hit()
+            return [geocode.longitude, geocode.latitude]
+
+        geocode_stats.miss()
+        return None
+
+    @staticmethod
+    def store(address, country, coordinates):
+        key = Geocode.normalize(address, country)
+        geocode = Geocode.query.filter_by(key=key).first()
+        if geocode is None:
+            geocode = Geocode(key=key)
+            db.session.add(geocode)
+            Geocode.evict()
+        geocode.longitude, geocode.latitude = coordinates
+        geocode.timestamp = datetime.utcnow()
+
+    @staticmethod
+    def search(address, country, refresh=False):
+        coordinates = Geocode.lookup(address, country, refresh=refresh)
+        if coordinates is not None:
+            return coordinates
+
+        coordinates = ors_client.search(address + ", " + country)
+        if coordinates is None:
+            return None
+
+        Geocode.store(address, country, coordinates)
+        return coordinates
+
+    @staticmethod
+    def evict():
+        size = current_app.config['GEOCODE_CACHE_SIZE']
+        with db.session.no_autoflush:
+            excess = Geocode.query.count() - size + 1
+            if excess > 0:
+                oldest = [id for id, in db.session.query(Geocode.id).order_by(Geocode.timestamp).limit(excess)]
+                Geocode.query.filter(Geocode.id.in_(oldest)).delete(synchronize_session=False)
+
+    def __repr__(self):
+        return f"<Geocode {self.key}, Latitude {self.latitude}, Longitude {self.longitude}>"
+
+
 class RouteMarker(db.Model):
     __tablename__ = 'route_marker'
 
@@ -191,8 +657,144 @@ class RouteMarker(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
 
-class Country(db.Model):
+def history_value(instance, attribute):
+    state = db.inspect(instance)
+    value = getattr(instance, attribute)
+    if value is None and state.attrs[attribute].history.deleted:
+        value = state.attrs[attribute].history.deleted[0]
+    return value
+
+
+@db.event.listens_for(db.session, 'before_flush')
+def aggregate_treks(session, flush_context, instances):
+    # Trek to whether its profile sample is rebuilt as well as its totals: sampling decodes every route of the
+    # trek, so it only happens when routes were added, removed or moved, or had their geometry changed.
+    treks = {}
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(instance, Trek):
+            resample = instance in session.new or db.inspect(instance).attrs.routes.history.has_changes()
+            treks[instance] = treks.get(instance, False) or resample
+        elif isinstance(instance, Route):
+            state = db.inspect(instance)
+            resample = (instance in session.new or instance in session.deleted
+                        or state.attrs.geometry.history.has_changes() or state.attrs.trek.history.has_changes())
+            for trek in [history_value(instance, 'trek')] + list(state.attrs.trek.history.deleted or ()):
+                treks[trek] = treks.get(trek, False) or resample
+        elif isinstance(instance, RouteMarker):
+            route = history_value(instance, 'route')
+            if route is not None:
+                trek = history_value(route, 'trek')
+                treks[trek] = treks.get(trek, False)
+
+    for trek, resample in treks.items():
+        if trek is not None and trek not in session.deleted:
+            trek.aggregate(session.deleted, resample)
+
+
+class ReferenceVersion(db.Model):
+    __tablename__ = 'reference_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, default=0)
+
+    @staticmethod
+    def current():
+        return db.session.query(ReferenceVersion.version).filter_by(id=1).scalar() or 0
+
+    @staticmethod
+    def bump(connection):
+        table = ReferenceVersion.__table__
+        connection.execute(table.update().where(table.c.id == 1).values(version=table.c.version + 1))
+
+    def __repr__(self):
+        return f"<ReferenceVersion {self.version}>"
+
+
+db.event.listen(ReferenceVersion.__table__, 'after_create', db.DDL(
+    "INSERT INTO reference_version (id, version) VALUES (1, 0)"))
+
+
+class Reference:
+    """Cached reads of a small, rarely written table.
+
+    Rows are kept detached in the process-wide reference cache and merged into
+    the current session without loading, so lookups issue no SQL.
+    """
+    reference_order = 'id'
+
+    @classmethod
+    def rows(cls):
+        return references().get()[cls.__name__]
+
+    @classmethod
+    def attach(cls, row):
+        if row is None:
+            return None
+        instance = db.session.identity_map.get(db.inspect(row).identity_key)
+        return instance if instance is not None else db.session.merge(row, load=False)
+
+    @classmethod
+    def choices(cls):
+        return [(row.id, row.name) for row in cls.rows()]
+
+    @classmethod
+    def cached_all(cls):
+        return [cls.attach(row) for row in cls.rows()]
+
+    @classmethod
+    def cached(cls, id):
+        return cls.attach(next((row for row in cls.rows() if row.id == id), None))
+
+    @classmethod
+    def cached_default(cls):
+        return cls.attach(next((row for row in cls.rows() if getattr(row, 'default', False)), None))
+
+
+def load_references():
+    rows = {}
+    for model in Reference.__subclasses__():
+        table = model.__table__
+        rows[model.__name__] = []
+        for row in db.session.execute(db.select(table).order_by(table.c[model.reference_order])):
+            instance = model(**row._mapping)
+            make_transient_to_detached(instance)
+            rows[model.__name__].append(instance)
+    return rows
+
+
+def references():
+    if 'references' not in current_app.extensions:
+        current_app.extensions['references'] = VersionedCache(
+            load_references, ReferenceVersion.current, current_app.config['REFERENCE_CACHE_INTERVAL'], reference_stats)
+    return current_app.extensions['references']
+
+
+def invalidate_references():
+    """Drop the reference cache of every process once the current transaction commits."""
+    ReferenceVersion.bump(db.session.connection())
+    db.session.info['references_changed'] = True
+
+
+@db.event.listens_for(db.session, 'after_flush')
+def track_references(session, flush_context):
+    changed = list(session.new) + list(session.deleted) + [
+        instance for instance in session.dirty if session.is_modified(instance, include_collections=False)]
+    if any(isinstance(instance, Reference) for instance in changed):
+        ReferenceVersion.bump(session.connection())
+        session.info['references_changed'] = True
+
+
+@db.event.listens_for(db.session, 'after_commit')
+@db.event.listens_for(db.session, 'after_soft_rollback')
+def expire_references(session, *args):
+    if session.info.pop('references_changed', False) and has_app_context():
+        if 'references' in current_app.extensions:
+            current_app.extensions['references'].invalidate()
+
+
+class Country(Reference, db.Model):
     __tablename__ = 'country'
+    reference_order = 'name'
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), unique=True)
@@ -205,8 +807,9 @@ class Country(db.Model):
         return f"<Country {self.name}>"
 
 
-class Folder(db.Model):
+class Folder(Reference, db.Model):
     __tablename__ = 'folder'
+    reference_order = 'name'
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), unique=True)
@@ -218,7 +821,7 @@ class Folder(db.Model):
         return f"<Folder {self.name}>"
 
 
-class Profile(db.Model):
+class Profile(Reference, db.Model):
     __tablename__ = 'profile'
 
     id = db.Column(db.Integer, primary_key=True)
@@ -244,7 +847,7 @@ class Profile(db.Model):
         return f"<Profile {self.name}, Default {self.default}>"
 
 
-class Preference(db.Model):
+class Preference(Reference, db.Model):
     __tablename__ = 'preference'
 
     id = db.Column(db.Integer, primary_key=True)
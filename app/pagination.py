@@ -0,0 +1,94 @@
+import json
+import base64
+from datetime import datetime
+
+
+from flask import request, abort
+
+
+from app import db
+from app.models import Trek, Marker
+
+
+TREK_SORTS = {
+    'position': Trek.position,
+    'name': Trek.name,
+    'distance': Trek.total_distance,
+    'timestamp': Trek.timestamp,
+}
+
+MARKER_SORTS = {
+    'name': Marker.name,
+    'timestamp': Marker.timestamp,
+}
+
+
+def encode_cursor(sort, order, value, key):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    data = json.dumps([sort, order, value, key], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort, order, column):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        cursor_sort, cursor_order, value, key = data
+        if value is not None and isinstance(column.type, db.DateTime):
+            value = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError("Malformed cursor.")
+    if (cursor_sort, cursor_order) != (sort, order) or not isinstance(key, int):
+        raise ValueError("Cursor does not match the requested sort.")
+    return value, key
+
+
+def seek(column, key, value, last, descending):
+    """Rows following (value, last) in (column, key) order, with NULLs first ascending and last descending."""
+    if descending:
+        if value is None:
+            return db.and_(column.is_(None), key < last)
+        return db.or_(db.and_(column <= value, db.or_(column < value, key < last)), column.is_(None))
+    if value is None:
+        return db.or_(column.isnot(None), db.and_(column.is_(None), key > last))
+    return db.and_(column >= value, db.or_(column > value, key > last))
+
+
+def keyset(query, sorts, sort, order, key, after=None, per_page=50):
+    """One page of query in (sort, key) order following the after cursor, and the cursor of the next page.
+
+    The cost of a page only depends on per_page, however far into the listing it is.
+    Raises ValueError on a cursor that does not belong to this sort.
+    """
+    column = sorts[sort]
+    descending = order == 'desc'
+    if after:
+        value, last = decode_cursor(after, sort, order, column)
+        query = query.filter(seek(column, key, value, last, descending))
+    if descending:
+        query = query.order_by(column.desc().nullslast(), key.desc())
+    else:
+        query = query.order_by(column.asc().nullsfirst(), key.asc())
+
+    items = query.limit(per_page + 1).all()
+    if len(items) <= per_page:
+        return items, None
+    last = items[per_page - 1]
+    return items[:per_page], encode_cursor(sort, order, getattr(last, column.key), getattr(last, key.key))
+
+
+def requested_page(query, sorts, default, key, per_page, paged=True):
+    """keyset() driven by the sort, order, after and per_page arguments of the request; 400 on bad ones.
+
+    With paged false the after argument is ignored and the first page is returned.
+    """
+    sort = request.args.get('sort', default)
+    order = request.args.get('order', 'asc')
+    per_page = min(max(request.args.get('per_page', per_page, type=int), 1), 500)
+    if sort not in sorts or order not in ('asc', 'desc'):
+        abort(400)
+    try:
+        items, cursor = keyset(query, sorts, sort, order, key, request.args.get('after') if paged else None, per_page)
+    except ValueError:
+        abort(400)
+    return items, cursor, {'sort': sort, 'order': order}
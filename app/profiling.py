@@ -0,0 +1,137 @@
+import os
+import sys
+import time
+import threading
+from collections import Counter
+from datetime import datetime
+from functools import wraps
+
+
+from flask import current_app, request, g, has_app_context
+from flask_sqlalchemy import get_debug_queries
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(limit):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            start = len(get_debug_queries())
+            response = view(*args, **kwargs)
+            if current_app.config.get('QUERY_BUDGET_ENFORCE', current_app.testing):
+                queries = get_debug_queries()[start:]
+                if len(queries) > limit:
+                    statements = "\n".join(query.statement for query in queries)
+                    raise QueryBudgetExceeded(
+                        f"{request.endpoint} ran {len(queries)} queries, budget is {limit}:\n{statements}")
+            return response
+        return wrapper
+    return decorator
+
+
+def record_ors(elapsed):
+    """Attribute time spent waiting on ORS to the current request, if any."""
+    if has_app_context():
+        g.ors_time = g.get('ors_time', 0.0) + elapsed
+        g.ors_calls = g.get('ors_calls', 0) + 1
+
+
+class Sampler:
+    """Samples the stacks of one thread at a fixed interval and folds them for flame graphs."""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self.fold(frame)] += 1
+
+    @staticmethod
+    def fold(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as stream:
+            for stack, count in self.stacks.most_common():
+                stream.write(f"{stack} {count}\n")
+
+
+def start_request():
+    g.request_start = time.perf_counter()
+    g.queries_start = len(get_debug_queries())
+    g.ors_time, g.ors_calls = 0.0, 0
+    if current_app.config['PROFILER_ENABLED']:
+        g.sampler = Sampler(threading.get_ident(), current_app.config['PROFILER_INTERVAL']).start()
+
+
+def finish_request(response):
+    wall = time.perf_counter() - g.pop('request_start', time.perf_counter())
+    queries = get_debug_queries()[g.pop('queries_start', 0):]
+    database = sum(query.duration for query in queries)
+    ors = g.get('ors_time', 0.0)
+
+    response.headers['Server-Timing'] = (f'app;dur={wall * 1000:.1f}, '
+                                         f'db;dur={database * 1000:.1f};desc="{len(queries)} queries", '
+                                         f'ors;dur={ors * 1000:.1f};desc="{g.get("ors_calls", 0)} calls"')
+
+    logger = current_app.logger
+    slow_query = current_app.config['SQLALCHEMY_SLOW_DB_QUERY_TIME']
+    for query in queries:
+        if query.duration >= slow_query:
+            logger.warning(f"Slow query in {request.endpoint} ({query.duration:.3f} s) from {query.context}:\n"
+                           f"{query.statement}\nParameters: {query.parameters}")
+
+    summary = (f"{request.method} {request.path} {response.status_code} in {wall * 1000:.1f} ms: "
+               f"{len(queries)} queries in {database * 1000:.1f} ms, "
+               f"{g.get('ors_calls', 0)} ORS calls in {ors * 1000:.1f} ms")
+    slow = wall >= current_app.config['SLOW_REQUEST_TIME']
+    if slow:
+        logger.warning(f"Slow request {summary}")
+    else:
+        logger.debug(summary)
+
+    sampler = g.pop('sampler', None)
+    if sampler is not None:
+        sampler.stop()
+        if wall >= current_app.config['PROFILER_THRESHOLD'] and sampler.stacks:
+            directory = current_app.config['PROFILER_DIRECTORY']
+            os.makedirs(directory, exist_ok=True)
+            name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{request.endpoint or 'unknown'}.folded"
+            sampler.dump(os.path.join(directory, name))
+            logger.info(f"Profile of {request.path} written to {name}")
+    return response
+
+
+def stop_sampler(exception=None):
+    sampler = g.pop('sampler', None)
+    if sampler is not None:
+        sampler.stop()
+
+
+def init_app(app):
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(stop_sampler)
@@ -0,0 +1,160 @@
+import json
+import math
+import time
+import random
+import hashlib
+import threading
+
+
+import numpy as np
+import requests
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+
+
+from app import geometry
+
+
+def request_key(method, path, params, body):
+    params = {key: value for key, value in params.items() if key != 'api_key'}
+    return hashlib.sha1(json.dumps([method, path, params, body], sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def terrain(latitude, longitude):
+    """Smooth, deterministic elevation in metres, standing in for a DEM."""
+    latitude, longitude = np.radians(latitude), np.radians(longitude)
+    elevation = (900 + 600 * np.sin(latitude * 40) * np.cos(longitude * 30)
+                 + 250 * np.sin(latitude * 170 + longitude * 130))
+    return np.round(np.maximum(elevation, 0), 1)
+
+
+def synthetic_search(text):
+    seed = int(hashlib.sha1(text.lower().encode('utf-8')).hexdigest()[:12], 16)
+    longitude = round(-4.5 + (seed % 100000) / 100000 * 12.0, 6)
+    latitude = round(43.0 + (seed // 100000 % 100000) / 100000 * 7.5, 6)
+    return {
+        "type": "FeatureCollection",
+        "features": [{
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [longitude, latitude]},
+            "properties": {"label": text, "confidence": 1},
+        }],
+    }
+
+
+def synthetic_elevation(body):
+    longitude, latitude = body['geometry'][:2]
+    return {
+        "type": "Point",
+        "geometry": {"type": "Point", "coordinates": [longitude, latitude, float(terrain(latitude, longitude))]},
+    }
+
+
+def synthetic_directions(body, spacing=200.0):
+    """A route following great-circle legs between the waypoints, sampled every spacing metres."""
+    waypoints = np.asarray(body['coordinates'], dtype=np.float64)
+    legs = []
+    for start, end in zip(waypoints[:-1], waypoints[1:]):
+        length = float(geometry.haversine(start[1], start[0], end[1], end[0]))
+        steps = max(2, min(int(math.ceil(length / spacing)) + 1, 5000))
+        legs.append(np.linspace(start, end, steps)[:-1])
+    points = np.vstack(legs + [waypoints[-1:]])
+    points = np.column_stack([np.round(points, 5), terrain(points[:, 1], points[:, 0])])
+
+    ascent, descent = geometry.climb(points[:, 2])
+    distance = float(geometry.segment_distances(points[:, [1, 0, 2]]).sum())
+    summary = {"distance": round(distance, 1), "ascent": round(ascent, 1), "descent": round(descent, 1)}
+    return {
+        "routes": [{
+            "summary": summary,
+            "geometry": geometry.encode_polyline(points.tolist()),
+            "way_points": [0, len(points) - 1],
+        }],
+        "metadata": {"query": body, "engine": {"version": "standin"}},
+    }
+
+
+class Recordings:
+    def __init__(self, path=None):
+        self.path = path
+        self.items = {}
+        self._lock = threading.Lock()
+        if path:
+            try:
+                with open(path, encoding='utf-8') as stream:
+                    self.items = json.load(stream)
+            except FileNotFoundError:
+                pass
+
+    def get(self, key):
+        return self.items.get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self.items[key] = value
+            if self.path:
+                with open(self.path, 'w', encoding='utf-8') as stream:
+                    json.dump(self.items, stream, indent=2, sort_keys=True)
+
+
+def create_standin(recordings=None, upstream=None, token=None, latency=0.0, jitter=0.0,
+                   error_rate=0.0, error_status=503, seed=None):
+    """An ORS-compatible WSGI app for offline runs.
+
+    Requests are answered from the recordings when possible. Otherwise they are
+    proxied to upstream and recorded, or synthesized when no upstream is given.
+    Latency and error responses can be injected with a seeded generator so that
+    runs are reproducible.
+    """
+    standin = Flask(__name__)
+    recordings = recordings if isinstance(recordings, Recordings) else Recordings(recordings)
+    generator = random.Random(seed)
+    lock = threading.Lock()
+    standin.extensions['recordings'] = recordings
+
+    def respond(synthesize):
+        with lock:
+            delay = latency + generator.uniform(0, jitter)
+            failed = generator.random() < error_rate
+        if delay:
+            time.sleep(delay)
+        if failed:
+            return jsonify(error={"code": error_status, "message": "Injected failure"}), error_status
+
+        params = request.args.to_dict()
+        body = request.get_json(silent=True)
+        key = request_key(request.method, request.path, params, body)
+        recorded = recordings.get(key)
+        if recorded is not None:
+            return jsonify(recorded['response']), recorded['status']
+
+        if upstream:
+            response = requests.request(request.method, upstream.rstrip('/') + request.path, params=params, json=body,
+                                        headers={'Authorization': token} if token else {}, timeout=60)
+            if response.status_code == 200:
+                recordings.set(key, {"method": request.method, "path": request.path, "params": params,
+                                     "json": body, "status": 200, "response": response.json()})
+            return jsonify(response.json()), response.status_code
+
+        return jsonify(synthesize(params, body))
+
+    @standin.route('/geocode/search', methods=['GET'])
+    def search():
+        return respond(lambda params, body: synthetic_search(params.get('text', '')))
+
+    @standin.route('/elevation/point', methods=['POST'])
+    def elevation():
+        return respond(lambda params, body: synthetic_elevation(body))
+
+    @standin.route('/v2/directions/<profile>/json', methods=['POST'])
+    def directions(profile):
+        return respond(lambda params, body: synthetic_directions(body))
+
+    return standin
+
+
+def serve(standin, host='127.0.0.1', port=0):
+    """Serve the stand-in from a daemon thread; the returned server knows its port and can be shut down."""
+    server = make_server(host, port, standin, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,127 @@
+import time
+import random
+import threading
+
+
+import requests
+from requests.adapters import HTTPAdapter
+import openrouteservice
+from openrouteservice import exceptions
+
+
+from app.metrics import ors_requests, ors_latency
+from app.profiling import record_ors
+
+
+RETRIABLE_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ORSTransport(openrouteservice.Client):
+    """ORS client sharing a pooled keep-alive session across threads.
+
+    Requests are throttled by one token bucket per operation (quotas are given
+    per minute) and retried with jittered exponential backoff on 429 and 5xx.
+    No wait exceeds max_backoff: a Retry-After asking for longer fails the call at once.
+    """
+
+    def __init__(self, key, base_url=None, timeout=None, pool_size=10, retries=3, backoff=0.5, rates=None,
+                 max_backoff=10.0):
+        kwargs = {'base_url': base_url} if base_url else {}
+        super().__init__(key=key, timeout=timeout, retry_over_query_limit=False, **kwargs)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.buckets = {operation: TokenBucket(rate / 60.0, rate) for operation, rate in (rates or {}).items()}
+
+    @staticmethod
+    def operation(url):
+        if url.startswith('/v2/directions'):
+            return 'directions'
+        if url.startswith('/elevation'):
+            return 'elevation'
+        if url.startswith('/geocode'):
+            return 'geocode'
+        return 'other'
+
+    def delay(self, attempt, response=None):
+        """Seconds to wait before the next attempt, or None when the server asks for longer than max_backoff."""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after) if float(retry_after) <= self.max_backoff else None
+        return random.uniform(0, min(self.backoff * 2 ** attempt, self.max_backoff))
+
+    def request(self, url, get_params=None, first_request_time=None, retry_counter=0,
+                requests_kwargs=None, post_json=None, dry_run=None):
+        if dry_run:
+            return super().request(url, get_params, requests_kwargs=requests_kwargs, post_json=post_json, dry_run=dry_run)
+
+        operation = self.operation(url)
+        bucket = self.buckets.get(operation)
+
+        kwargs = dict(self._requests_kwargs, **(requests_kwargs or {}))
+        method = self._session.get
+        if post_json is not None:
+            method = self._session.post
+            kwargs['json'] = post_json
+        authed_url = self._base_url + self._generate_auth_url(url, get_params)
+
+        for attempt in range(self.retries + 1):
+            if bucket is not None:
+                bucket.acquire()
+
+            start = time.perf_counter()
+            try:
+                response = method(authed_url, **kwargs)
+            except requests.exceptions.Timeout:
+                response = None
+            elapsed = time.perf_counter() - start
+            ors_latency.observe(elapsed, operation)
+            record_ors(elapsed)
+
+            if response is None:
+                ors_requests.inc(operation, 'timeout')
+                if attempt == self.retries:
+                    raise exceptions.Timeout()
+                time.sleep(self.delay(attempt))
+                continue
+
+            self._req = response.request
+            ors_requests.inc(operation, str(response.status_code))
+            if response.status_code in RETRIABLE_STATUSES and attempt < self.retries:
+                delay = self.delay(attempt, response)
+                if delay is not None:
+                    time.sleep(delay)
+                    continue
+            return self._get_body(response)
+
+
+def create_transport(config):
+    return ORSTransport(
+        config.get('ORS_TOKEN'), base_url=config.get('ORS_BASE_URL'), timeout=config.get('ORS_TIMEOUT'),
+        pool_size=config.get('ORS_POOL_SIZE', 10), retries=config.get('ORS_RETRIES', 3),
+        backoff=config.get('ORS_BACKOFF', 0.5), rates=config.get('ORS_RATE_LIMITS'),
+        max_backoff=config.get('ORS_MAX_BACKOFF', 10.0))
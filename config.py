@@ -9,8 +9,52 @@ load_dotenv(os.path.join(basedir, '.env'))
 class Config(object):
     SECRET_KEY = os.environ.get('SECRET_KEY')
     ORS_TOKEN = os.environ.get('ORS_TOKEN')
+    ORS_BASE_URL = os.environ.get('ORS_BASE_URL') or 'https://api.openrouteservice.org'
+    ORS_TIMEOUT = (3.05, 30)
+    ORS_POOL_SIZE = 10
+    ORS_RETRIES = 3
+    ORS_BACKOFF = 0.5
+    ORS_MAX_BACKOFF = 10.0
+    ORS_RATE_LIMITS = {'directions': 40, 'geocode': 100, 'elevation': 100}
 
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_RECORD_QUERIES = True
-    SQLALCHEMY_SLOW_DB_QUERY_TIME = 0.5
\ No newline at end of file
+    SQLALCHEMY_SLOW_DB_QUERY_TIME = 0.5
+
+    SLOW_REQUEST_TIME = 1.0
+    PROFILER_ENABLED = bool(os.environ.get('PROFILER_ENABLED'))
+    PROFILER_INTERVAL = 0.005
+    PROFILER_THRESHOLD = 0.5
+    PROFILER_DIRECTORY = os.path.join(basedir, 'logs', 'profiles')
+
+    METRICS_DIRECTORY = os.environ.get('METRICS_DIRECTORY')
+    METRICS_FLUSH_INTERVAL = 5
+    METRICS_STALE_AFTER = 30
+
+    GEOCODE_CACHE_TTL = 30 * 24 * 3600
+    GEOCODE_CACHE_SIZE = 10000
+    GEOCODE_CACHE_BYPASS = False
+
+    ELEVATION_DEM_DIRECTORY = os.environ.get('ELEVATION_DEM_DIRECTORY')
+    ELEVATION_DEM_TILES = 16
+
+    DIRECTIONS_CACHE_BACKEND = 'database'
+    DIRECTIONS_CACHE_SIZE = 1000
+
+    REFERENCE_CACHE_INTERVAL = 5
+
+    TREKS_PER_PAGE = 50
+    MAPS_PER_PAGE = 10
+    MARKERS_PER_PAGE = 50
+
+    ROUTE_LOD_TOLERANCES = [0.00005, 0.0002, 0.001, 0.005]
+    ROUTE_GEOMETRY_MEMO_SIZE = 64
+
+    ELEVATION_PROFILE_POINTS = 500
+
+    JOBS_WORKERS = 2
+    JOBS_EAGER = False
+
+    MARKERS_IMPORT_WORKERS = 8
+    MARKERS_IMPORT_BATCH = 200
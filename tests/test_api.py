@@ -0,0 +1,116 @@
+import unittest
+from datetime import datetime
+
+
+from app import create_app, db, geometry
+from app.models import User, Trek, Route, Marker, Profile, Preference
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SECRET_KEY = 'secret'
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+class ApiCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        Profile.insert_modes()
+        Preference.insert_options()
+
+        self.user = User(username='user', email='user@example.com')
+        self.user.set_password('password')
+
+        self.trek = Trek(name='Trek')
+        self.route = Route(name='Route', geometry=geometry.pack([[5.71854, 45.17788, 221.0], [5.72, 45.18, 230.5]]))
+        self.route.markers.append(Marker(name='Marker', latitude=45.17788, longitude=5.71854, elevation=221))
+        self.trek.routes.append(self.route)
+        self.user.treks.append(self.trek)
+
+        db.session.add(self.user)
+        db.session.commit()
+
+        self.client = self.app.test_client()
+        self.client.post('/auth/login', data={'username': 'user', 'password': 'password'})
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_routes(self):
+        response = self.client.get(f'/api/treks/{self.trek.id}/routes')
+        feature = response.get_json()['features'][0]
+
+        self.assertEqual(feature['geometry']['coordinates'], [[5.71854, 45.17788, 221.0], [5.72, 45.18, 230.5]])
+        self.assertEqual(feature['properties']['name'], 'Route')
+
+    def test_routes_zoom(self):
+        points = [[5.0 + i / 10000, 45.0 + (i % 2) / 100000, 200.0] for i in range(10000)]
+        self.route.geometry = geometry.pack(points)
+        self.route.simplify()
+        db.session.commit()
+
+        def size(zoom):
+            response = self.client.get(f'/api/treks/{self.trek.id}/routes?zoom={zoom}')
+            return len(response.get_json()['features'][0]['geometry']['coordinates'])
+
+        self.assertEqual(size(18), 10000)
+        self.assertLess(size(8), 10)
+
+    def test_markers(self):
+        response = self.client.get(f'/api/treks/{self.trek.id}/markers')
+        feature = response.get_json()['features'][0]
+
+        self.assertEqual(feature['geometry']['coordinates'], [5.71854, 45.17788])
+        self.assertEqual(feature['properties']['route_id'], self.route.id)
+
+    def test_profile(self):
+        response = self.client.get(f'/api/treks/{self.trek.id}/profile')
+
+        self.assertEqual(len(response.get_json()['profile']), 2)
+
+    def test_etag(self):
+        url = f'/api/treks/{self.trek.id}/routes'
+        response = self.client.get(url)
+        etag = response.headers['ETag']
+
+        self.assertIn('no-cache', response.headers['Cache-Control'])
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+        self.route.geometry = geometry.pack([[5.7, 45.1, 200.0]])
+        self.route.timestamp = datetime.utcnow()
+        db.session.commit()
+
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_markers_etag(self):
+        url = f'/api/treks/{self.trek.id}/markers'
+        etag = self.client.get(url).headers['ETag']
+
+        self.route.markers[0].latitude = 45.2
+        db.session.commit()
+
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['features'][0]['geometry']['coordinates'], [5.71854, 45.2])
+
+    def test_not_found(self):
+        other = User(username='other', email='other@example.com')
+        other.treks.append(Trek(name='Other'))
+        db.session.add(other)
+        db.session.commit()
+
+        self.assertEqual(self.client.get(f'/api/treks/{other.treks[0].id}/routes').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
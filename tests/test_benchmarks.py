@@ -0,0 +1,67 @@
+import json
+import os
+import tempfile
+import unittest
+
+
+from app import create_app, benchmarks, cli
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+class BenchmarkCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        cli.register(self.app)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_run(self):
+        results = benchmarks.run([200], min_time=0.001)
+
+        self.assertEqual([result["name"] for result in results], [
+            'route.coordinates', 'polyline.decode', 'ors_client.haversine', 'trek.elevation_profile',
+            'export_trek_as_gpx', 'stream_trek_as_gpx', 'index.html'])
+        for result in results:
+            self.assertEqual(result["points"], 200)
+            self.assertGreater(result["ops_per_sec"], 0)
+            self.assertGreater(result["peak_memory"], 0)
+
+    def test_compare(self):
+        baseline = [{"name": "polyline.decode", "points": 100, "ops_per_sec": 100.0, "peak_memory": 1000}]
+
+        self.assertEqual(benchmarks.compare(
+            [{"name": "polyline.decode", "points": 100, "ops_per_sec": 90.0, "peak_memory": 1100}], baseline), [])
+        self.assertEqual(len(benchmarks.compare(
+            [{"name": "polyline.decode", "points": 100, "ops_per_sec": 70.0, "peak_memory": 1300}], baseline)), 2)
+        self.assertEqual(benchmarks.compare(
+            [{"name": "polyline.decode", "points": 200, "ops_per_sec": 1.0, "peak_memory": 1}], baseline), [])
+
+    def test_cli(self):
+        output = os.path.join(self.directory.name, 'bench.json')
+        runner = self.app.test_cli_runner()
+
+        result = runner.invoke(args=['bench', 'run', '--sizes', '100', '--min-time', '0.001',
+                                     '--select', 'polyline', '--output', output])
+        self.assertEqual(result.exit_code, 0, result.output)
+        with open(output) as stream:
+            saved = json.load(stream)
+        self.assertEqual([result["name"] for result in saved["results"]], ['polyline.decode'])
+
+        saved["results"][0]["ops_per_sec"] *= 1000
+        with open(output, 'w') as stream:
+            json.dump(saved, stream)
+        result = runner.invoke(args=['bench', 'run', '--sizes', '100', '--min-time', '0.001',
+                                     '--select', 'polyline', '--baseline', output])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn('Regression: polyline.decode @ 100', result.output)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,98 @@
+import unittest
+
+
+import numpy as np
+
+
+from app import create_app, db, geometry
+from app.models import User, Trek, Route, Profile, Preference, route_segment_index
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SECRET_KEY = 'secret'
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+def path(*points):
+    return geometry.pack(np.array([[longitude, latitude, 0.0] for latitude, longitude in points]))
+
+
+class CorridorCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        Profile.insert_modes()
+        Preference.insert_options()
+
+        self.user = User(username='user', email='user@example.com')
+        self.user.set_password('password')
+        other = User(username='other', email='other@example.com')
+        self.trek = Trek(name='Chartreuse')
+        self.trek.routes.append(Route(name='North', geometry=path((45.0, 5.0), (45.0, 5.01), (45.01, 5.01))))
+        self.trek.routes.append(Route(name='South', geometry=path((44.99, 5.0), (44.99, 5.02))))
+        self.user.treks.append(self.trek)
+        other.treks.append(Trek(name='Other', routes=[Route(name='Copy', geometry=path((45.0, 5.0), (45.0, 5.01)))]))
+        db.session.add_all([self.user, other])
+        db.session.commit()
+
+        self.query = Route.query.join(Trek).filter(Trek.user_id == self.user.id)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def segments(self, route):
+        return db.session.execute(db.select(db.func.count()).select_from(route_segment_index).where(
+            route_segment_index.c.route_id == route.id)).scalar()
+
+    def test_sync(self):
+        north, south = self.trek.routes
+
+        self.assertEqual(self.segments(north), 2)
+        north.geometry = path((45.0, 5.0), (45.0, 5.005), (45.0, 5.01), (45.01, 5.01))
+        db.session.commit()
+        self.assertEqual(self.segments(north), 3)
+
+        db.session.delete(south)
+        db.session.commit()
+        self.assertEqual(self.segments(south), 0)
+
+        db.session.execute(route_segment_index.delete())
+        Route.reindex()
+        self.assertEqual(self.segments(north), 3)
+
+    def test_corridor(self):
+        found = Route.corridor(self.query, 45.0005, 5.005, 500)
+
+        self.assertEqual([route.name for route, _, _ in found], ['North'])
+        _, distance, along = found[0]
+        self.assertAlmostEqual(distance, 55.6, delta=0.5)
+        self.assertAlmostEqual(along, 393.2, delta=1)
+
+        found = Route.corridor(self.query, 44.995, 5.0105, 1000)
+        self.assertEqual([route.name for route, _, _ in found], ['South', 'North'])
+        self.assertAlmostEqual(found[1][2], 786.5, delta=1)
+
+        self.assertEqual(Route.corridor(self.query, 46.0, 6.0, 500), [])
+
+    def test_endpoint(self):
+        client = self.app.test_client()
+        client.post('/auth/login', data={'username': 'user', 'password': 'password'})
+
+        response = client.get('/api/routes/nearby?lat=44.995&lon=5.0105&radius=1000')
+        data = response.get_json()
+        self.assertEqual([route['name'] for route in data['routes']], ['South', 'North'])
+        self.assertEqual([trek['name'] for trek in data['treks']], ['Chartreuse'])
+
+        self.assertEqual(client.get('/api/routes/nearby?lat=45').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,76 @@
+import unittest
+from unittest.mock import patch
+
+
+from app import create_app, db, geometry
+from app.cache import directions_stats
+from app.models import Direction, Marker
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    DIRECTIONS_CACHE_SIZE = 2
+
+
+class DirectionModelCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        directions_stats.reset()
+        self.path = geometry.encode_polyline([[5.71854, 45.17788, 221.0], [-0.88308, 47.05861, 12.0]])
+        self.directions = patch('app.models.ors_client.directions', return_value=(self.path, 1000.0, 10.0, 20.0)).start()
+
+        self.marker_1 = Marker(name='Marker_1', latitude=45.177879, longitude=5.718545)
+        self.marker_2 = Marker(name='Marker_2', latitude=47.058606, longitude=-0.883084)
+        self.marker_3 = Marker(name='Marker_3', latitude=45.764043, longitude=4.835659)
+
+    def tearDown(self):
+        patch.stopall()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_hit(self):
+        Direction.search([self.marker_1, self.marker_2], 'cycling-regular', 'shortest')
+        db.session.commit()
+        blob, distance, ascent, descent = Direction.search([self.marker_1, self.marker_2], 'cycling-regular', 'shortest')
+
+        self.assertEqual((distance, ascent, descent), (1000.0, 10.0, 20.0))
+        self.assertEqual(geometry.unpack(blob).shape, (2, 3))
+        self.assertEqual(self.directions.call_count, 1)
+        self.assertEqual(directions_stats.hits, 1)
+
+    def test_key(self):
+        Direction.search([self.marker_1, self.marker_2], 'cycling-regular', 'shortest')
+        Direction.search([self.marker_2, self.marker_1], 'cycling-regular', 'shortest')
+        Direction.search([self.marker_1, self.marker_2], 'foot-hiking', 'shortest')
+
+        self.assertEqual(self.directions.call_count, 3)
+
+    def test_evict(self):
+        markers = [[self.marker_1, self.marker_2], [self.marker_2, self.marker_3], [self.marker_1, self.marker_3]]
+        for locations in markers:
+            Direction.search(locations, 'cycling-regular', 'shortest')
+            db.session.commit()
+
+        self.assertEqual(Direction.query.count(), 2)
+        Direction.search(markers[0], 'cycling-regular', 'shortest')
+        self.assertEqual(self.directions.call_count, 4)
+
+    def test_memory(self):
+        self.app.config['DIRECTIONS_CACHE_BACKEND'] = 'memory'
+        self.app.extensions.pop('directions', None)
+        Direction.search([self.marker_1, self.marker_2], 'cycling-regular', 'shortest')
+        Direction.search([self.marker_1, self.marker_2], 'cycling-regular', 'shortest')
+
+        self.assertEqual(self.directions.call_count, 1)
+        self.assertEqual(Direction.query.count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
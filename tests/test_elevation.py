@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+
+import numpy as np
+
+
+from app.elevation import DEMElevationProvider, ElevationProvider
+
+
+class ConstantProvider(ElevationProvider):
+    def elevations(self, locations):
+        return [-1.0 for _ in locations]
+
+
+class ElevationCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        size = 1201
+        rows, cols = np.mgrid[0:size, 0:size]
+        data = (rows * 2 + cols).astype('>i2')
+        data[0, 0] = -32768
+        data.tofile(os.path.join(self.directory, 'N45E005.hgt'))
+
+        self.provider = DEMElevationProvider(self.directory, tiles=1, fallback=ConstantProvider())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_tile_name(self):
+        self.assertEqual(DEMElevationProvider.tile_name(45.17, 5.71), 'N45E005.hgt')
+        self.assertEqual(DEMElevationProvider.tile_name(-0.5, -72.1), 'S01W073.hgt')
+
+    def test_grid(self):
+        self.assertAlmostEqual(self.provider.elevation(45.5, 5.5), 600 * 2 + 600)
+        self.assertAlmostEqual(self.provider.elevation(45.0, 5.0), 1200 * 2)
+
+    def test_bilinear(self):
+        latitude = 46 - 10.25 / 1200
+        longitude = 5 + 20.5 / 1200
+
+        self.assertAlmostEqual(self.provider.elevation(latitude, longitude), 10.25 * 2 + 20.5)
+
+    def test_batch(self):
+        elevations = self.provider.elevations([(45.5, 5.5), (40.0, 2.0), (46.0, 5.0)])
+
+        self.assertAlmostEqual(elevations[0], 1800)
+        self.assertEqual(elevations[1], -1.0)
+        self.assertEqual(elevations[2], -1.0)
+
+    def test_lru(self):
+        self.provider.elevation(40.0, 2.0)
+        self.provider.elevation(45.5, 5.5)
+
+        self.assertEqual(list(self.provider._cache), ['N45E005.hgt'])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
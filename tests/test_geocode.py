@@ -0,0 +1,80 @@
+import unittest
+from unittest.mock import patch
+
+
+from app import create_app, db
+from app.cache import geocode_stats
+from app.models import Geocode, Marker, Country
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    GEOCODE_CACHE_SIZE = 2
+
+
+class GeocodeModelCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        geocode_stats.reset()
+        self.search = patch('app.models.ors_client.search', return_value=[5.718545, 45.177879]).start()
+
+    def tearDown(self):
+        patch.stopall()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_hit(self):
+        Geocode.search("Grenoble", "France")
+        db.session.commit()
+        coordinates = Geocode.search("  grenoble ", "FRANCE")
+
+        self.assertEqual(coordinates, [5.718545, 45.177879])
+        self.assertEqual(self.search.call_count, 1)
+        self.assertEqual(geocode_stats.hits, 1)
+        self.assertEqual(geocode_stats.misses, 1)
+
+    def test_refresh(self):
+        Geocode.search("Grenoble", "France")
+        Geocode.search("Grenoble", "France", refresh=True)
+
+        self.assertEqual(self.search.call_count, 2)
+        self.assertEqual(Geocode.query.count(), 1)
+
+    def test_ttl(self):
+        self.app.config['GEOCODE_CACHE_TTL'] = 0
+        Geocode.search("Grenoble", "France")
+        Geocode.search("Grenoble", "France")
+
+        self.assertEqual(self.search.call_count, 2)
+
+    def test_evict(self):
+        for address in ["Grenoble", "Lyon", "Paris"]:
+            Geocode.search(address, "France")
+            db.session.commit()
+
+        self.assertEqual(Geocode.query.count(), 2)
+        self.assertIsNone(Geocode.query.filter_by(key=Geocode.normalize("Grenoble", "France")).first())
+
+    def test_failure(self):
+        self.search.return_value = None
+
+        self.assertIsNone(Geocode.search("Grenoble", "France"))
+        self.assertEqual(Geocode.query.count(), 0)
+
+    def test_marker_failure(self):
+        self.search.return_value = None
+        marker = Marker(name='Marker', address='Grenoble', country=Country(name='France'), latitude=1.0, longitude=2.0)
+
+        self.assertFalse(marker.update())
+        self.assertEqual((marker.latitude, marker.longitude), (1.0, 2.0))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -1,18 +1,33 @@
+import os
 import unittest
 
 
 from app import create_app, db
 from app.geocoding import ors_client, ors_profile, ors_preference
 from app.models import Marker
+from app.standin import create_standin, serve
 from config import Config
 
 
+RECORDINGS = os.path.join(os.path.dirname(__file__), 'recordings', 'ors.json')
+
+
 class TestConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    ORS_TOKEN = 'dummy'
 
 
 class GeocodingModelCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = serve(create_standin(RECORDINGS))
+        TestConfig.ORS_BASE_URL = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
     def setUp(self):
         self.app = create_app(TestConfig)
         self.app_context = self.app.app_context()
@@ -54,4 +69,4 @@ class GeocodingModelCase(unittest.TestCase):
         location_1 = [45.177879, 5.718545]
         location_2 = [47.058606, -0.883084]
 
-        self.assertEqual(int(ors_client.haversine(location_1, location_2)), 550064)
\ No newline at end of file
+        self.assertEqual(int(ors_client.haversine(location_1, location_2)), 550064)
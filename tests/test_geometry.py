@@ -0,0 +1,108 @@
+import math
+import unittest
+
+
+import numpy as np
+
+
+from app import geometry
+
+
+def reference_haversine(coord1, coord2):
+    r = 6372800
+    lat1, lon1 = (coord1[0], coord1[1])
+    lat2, lon2 = (coord2[0], coord2[1])
+
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+
+    a = math.sin(dphi / 2) ** 2 + \
+        math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+
+    return 2 * r * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+class GeometryCase(unittest.TestCase):
+    def setUp(self):
+        random = np.random.default_rng(0)
+        steps = random.normal(0, 0.001, size=(1000, 2))
+        self.coordinates = np.column_stack([
+            45.177879 + np.cumsum(steps[:, 0]),
+            5.718545 + np.cumsum(steps[:, 1]),
+            random.uniform(200, 2500, size=1000)])
+
+    def test_haversine(self):
+        location_1 = [45.177879, 5.718545]
+        location_2 = [47.058606, -0.883084]
+
+        self.assertAlmostEqual(
+            float(geometry.haversine(*location_1, *location_2)), reference_haversine(location_1, location_2), places=6)
+
+    def test_segment_distances(self):
+        expected = [reference_haversine(self.coordinates[i - 1], self.coordinates[i]) for i in range(1, len(self.coordinates))]
+
+        np.testing.assert_allclose(geometry.segment_distances(self.coordinates), expected, rtol=1e-9)
+
+    def test_elevation_profile(self):
+        d = 0
+        expected = [{"x": d, "y": self.coordinates[0][2]}]
+        for i in range(1, len(self.coordinates)):
+            d += reference_haversine(self.coordinates[i - 1], self.coordinates[i])
+            expected.append({"x": d / 1000, "y": self.coordinates[i][2]})
+
+        x, y = geometry.elevation_profile(self.coordinates)
+        np.testing.assert_allclose(x, [p["x"] for p in expected], rtol=1e-9)
+        np.testing.assert_allclose(y, [p["y"] for p in expected])
+
+    def test_climb(self):
+        self.assertEqual(geometry.climb([100, 120, 110, 150, 150]), (60.0, 10.0))
+        self.assertEqual(geometry.climb([100]), (0.0, 0.0))
+
+    def test_fill_gaps(self):
+        self.assertEqual(geometry.fill_gaps([np.nan, 100, np.nan, 200, np.nan]).tolist(), [100, 100, 150, 200, 200])
+        self.assertEqual(geometry.fill_gaps([np.nan, np.nan]).tolist(), [0, 0])
+
+    def test_approach(self):
+        distances, fractions = geometry.approach(45.0, 5.0, [45.001, 45.001], [4.99, 5.001], [45.001, 45.002], [5.01, 5.001])
+
+        np.testing.assert_allclose(distances, [111.2, 136.2], atol=0.1)
+        self.assertEqual(fractions.tolist(), [0.5, 0.0])
+
+    def test_single_point(self):
+        x, y = geometry.elevation_profile(self.coordinates[:1])
+
+        self.assertEqual(x.tolist(), [0.0])
+
+    def test_simplify(self):
+        line = np.column_stack([np.linspace(5.0, 6.0, 1001), np.full(1001, 45.0), np.zeros(1001)])
+        line[500, 1] = 45.01
+
+        simplified = geometry.simplify(line, 0.001)
+        self.assertEqual(simplified[:, 0].tolist(), [5.0, 5.499, 5.5, 5.501, 6.0])
+
+    def test_simplify_tolerance(self):
+        sizes = [len(geometry.simplify(self.coordinates[:, [1, 0, 2]], tolerance)) for tolerance in [0.0, 0.001, 0.01]]
+
+        self.assertEqual(sizes[0], 1000)
+        self.assertTrue(sizes[0] > sizes[1] > sizes[2] >= 2)
+
+    def test_lttb(self):
+        x = np.arange(10000, dtype=float)
+        y = np.sin(x / 500)
+        y[1234] = 10
+
+        indices = geometry.lttb(x, y, 200)
+        self.assertEqual(len(indices), 200)
+        self.assertEqual(indices[0], 0)
+        self.assertEqual(indices[-1], 9999)
+        self.assertIn(1234, indices)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+
+    def test_zoom_tolerance(self):
+        self.assertAlmostEqual(geometry.zoom_tolerance(0), 360 / 256)
+        self.assertAlmostEqual(geometry.zoom_tolerance(1), 180 / 256)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -126,6 +126,36 @@ class UserModelCase(unittest.TestCase):
         self.assertEqual(RouteMarker.query.count(), 0)
         self.assertEqual(Marker.query.count(), 0)
 
+    def test_aggregate(self):
+        self.assertEqual(self.trek.nb_routes(), 2)
+        self.assertEqual(self.trek.nb_markers(), 4)
+
+        self.route_1.distance, self.route_1.ascent, self.route_1.descent = 1000.0, 10.0, 20.0
+        self.route_2.distance = 500.0
+        db.session.commit()
+
+        self.assertEqual(self.trek.distance(), 1500.0)
+        self.assertEqual(self.trek.ascent(), 10.0)
+        self.assertEqual(self.trek.descent(), 20.0)
+
+    def test_aggregate_delete(self):
+        db.session.delete(self.marker_1)
+        db.session.commit()
+        self.assertEqual(self.trek.nb_markers(), 2)
+
+        self.route_2.markers.remove(self.marker_2)
+        db.session.commit()
+        self.assertEqual(self.trek.nb_markers(), 1)
+
+        self.trek.routes.remove(self.route_1)
+        db.session.commit()
+        self.assertEqual(self.trek.nb_routes(), 1)
+        self.assertEqual(self.trek.nb_markers(), 0)
+
+        db.session.delete(self.route_2)
+        db.session.commit()
+        self.assertEqual(self.trek.nb_routes(), 0)
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
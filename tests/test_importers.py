@@ -0,0 +1,266 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, Mock
+
+
+from app import create_app, db, cli
+from app.importers import read_csv, read_gpx_waypoints, read_gpx_tracks, import_markers, import_tracks
+from app.models import User, Trek, Route, Marker, Geocode, Country, Folder, Profile, Preference
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SECRET_KEY = 'secret'
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    MARKERS_IMPORT_WORKERS = 4
+    MARKERS_IMPORT_BATCH = 2
+
+
+CSV = b"""name,address,country,folder,latitude,longitude
+Bastille,Fort de la Bastille,,,,
+Chamrousse,Chamrousse,,Ski,,
+Moucherotte,Le Moucherotte,,,45.1422,5.6258
+Unknown,Nowhere,,,,
+Duplicate,Fort de la Bastille,,,,
+Invalid,,,,,
+"""
+
+GPX = b"""<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">
+  <wpt lat="45.17788" lon="5.71854"><ele>221</ele><name>Grenoble</name></wpt>
+  <wpt lat="47.05861" lon="-0.88308"><name>Cholet</name><desc>Place Travot, Cholet</desc></wpt>
+</gpx>
+"""
+
+TRACKS = b"""<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">
+  <wpt lat="45.2001" lon="5.7001"><name>Summit</name></wpt>
+  <wpt lat="45.1000" lon="5.6000"><ele>200</ele><name>Start</name></wpt>
+  <wpt lat="46.0000" lon="6.0000"><ele>900</ele><name>Pass</name></wpt>
+  <trk>
+    <name>Ascent</name>
+    <trkseg>
+      <trkpt lat="45.1000" lon="5.6000"><ele>200</ele></trkpt>
+      <trkpt lat="45.1500" lon="5.6500"><ele>500</ele></trkpt>
+      <trkpt lat="45.1800" lon="5.6800"></trkpt>
+    </trkseg>
+    <trkseg>
+      <trkpt lat="45.2000" lon="5.7000"><ele>700</ele></trkpt>
+    </trkseg>
+  </trk>
+  <trk>
+    <name>Traverse</name>
+    <trkseg>
+      <trkpt lat="46.0000" lon="6.0000"><ele>900</ele></trkpt>
+      <trkpt lat="46.0100" lon="6.0100"><ele>850</ele></trkpt>
+    </trkseg>
+  </trk>
+  <trk><name>Empty</name><trkseg><trkpt lat="46.0" lon="6.0"/></trkseg></trk>
+</gpx>
+"""
+
+
+def search(address):
+    return None if address.startswith("Nowhere") else [5.72, 45.19]
+
+
+class ImportCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        Profile.insert_modes()
+        Preference.insert_options()
+
+        self.user = User(username='user', email='user@example.com')
+        self.user.set_password('password')
+        self.folder = Folder(name='Default')
+        db.session.add_all([self.user, self.folder, Folder(name='Ski'), Country(name='France', default=True)])
+        db.session.commit()
+
+        self.search = patch('app.importers.ors_client.search', side_effect=search).start()
+        provider = Mock(elevations=Mock(side_effect=lambda locations: [1000.0] * len(locations)))
+        patch('app.importers.elevation_provider', return_value=provider).start()
+
+    def tearDown(self):
+        patch.stopall()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_read_csv(self):
+        rows = list(read_csv(io.BytesIO(CSV)))
+
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0].line, 2)
+        self.assertEqual((rows[2].latitude, rows[2].longitude), (45.1422, 5.6258))
+        self.assertIsNone(rows[5].address)
+
+    def test_read_gpx_waypoints(self):
+        rows = list(read_gpx_waypoints(io.BytesIO(GPX)))
+
+        self.assertEqual([row.name for row in rows], ['Grenoble', 'Cholet'])
+        self.assertEqual(rows[0].address, "45.17788, 5.71854")
+        self.assertEqual(rows[0].elevation, 221.0)
+        self.assertEqual(rows[1].address, "Place Travot, Cholet")
+
+    def test_import_csv(self):
+        result = import_markers(self.user, read_csv(io.BytesIO(CSV)), folder=self.folder)
+
+        self.assertEqual(result.created, 3)
+        self.assertEqual(result.skipped, 1)
+        self.assertEqual([line for line, _, _ in result.failures], [7, 5])
+        self.assertEqual(self.search.call_count, 3)
+        self.assertEqual(Geocode.query.count(), 2)
+        self.assertEqual(Marker.query.filter_by(name='Chamrousse').one().folder.name, 'Ski')
+        self.assertEqual(Marker.query.filter_by(name='Moucherotte').one().elevation, 1000.0)
+        self.assertEqual(self.user.markers.count(), 3)
+
+    def test_import_existing(self):
+        db.session.add(Marker(name='Bastille', address='Fort de la Bastille'))
+        db.session.commit()
+
+        result = import_markers(self.user, read_csv(io.BytesIO(CSV)), folder=self.folder)
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual(result.skipped, 2)
+
+    def test_import_name_conflict(self):
+        db.session.add(Marker(name='Grenoble', address='Grenoble'))
+        db.session.commit()
+
+        result = import_markers(self.user, read_gpx_waypoints(io.BytesIO(GPX)), folder=self.folder)
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.failures, [(1, 'Grenoble', "Marker already exists.")])
+        self.assertEqual(self.search.call_count, 0)
+
+    def test_import_malformed(self):
+        rows = b"name,address,latitude,longitude\nGood,Good place,45.1,5.7\nBad,Bad place,45.1x,5.7\nAlso good,Other place,,\n"
+        result = import_markers(self.user, read_csv(io.BytesIO(rows)), folder=self.folder)
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual(result.failures, [(3, 'Bad', "Latitude, longitude and elevation must be numbers.")])
+
+        waypoints = GPX.replace(b'<wpt lat="45.17788" lon', b'<wpt lon')
+        result = import_markers(self.user, read_gpx_waypoints(io.BytesIO(waypoints)), folder=self.folder)
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.failures, [(1, 'Grenoble', "Missing or invalid lat, lon or ele.")])
+
+        tracks, waypoints = read_gpx_tracks(io.BytesIO(TRACKS.replace(b'<trkpt lat="45.1500" lon', b'<trkpt lon')))
+        self.assertEqual(tracks[0][1].shape, (3, 3))
+
+    def test_upload(self):
+        client = self.app.test_client()
+        client.post('/auth/login', data={'username': 'user', 'password': 'password'})
+        response = client.post('/api/markers/import', data={
+            'folder': str(self.folder.id),
+            'file': (io.BytesIO(GPX), 'waypoints.gpx'),
+        }, content_type='multipart/form-data')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {"created": 2, "skipped": 0, "failures": []})
+
+        response = client.post('/api/markers/import', data={}, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 400)
+
+    def test_upload_malformed(self):
+        client = self.app.test_client()
+        client.post('/auth/login', data={'username': 'user', 'password': 'password'})
+        runner = self.app.test_cli_runner()
+        cli.register(self.app)
+
+        for content, filename in ((b"name,address\nCaf\xe9,Rue Haute\n", 'markers.csv'), (GPX[:-10], 'markers.gpx')):
+            response = client.post('/api/markers/import', data={
+                'folder': str(self.folder.id),
+                'file': (io.BytesIO(content), filename),
+            }, content_type='multipart/form-data')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('Invalid file', response.get_json()['error'])
+
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, filename)
+                with open(path, 'wb') as stream:
+                    stream.write(content)
+                result = runner.invoke(args=['markers', 'import', path, '--user', 'user', '--folder', 'Default'])
+            self.assertEqual(result.exit_code, 1)
+            self.assertIn('Invalid file', result.output)
+
+        self.assertEqual(Marker.query.count(), 0)
+
+    def test_read_gpx_tracks(self):
+        tracks, waypoints = read_gpx_tracks(io.BytesIO(TRACKS))
+
+        self.assertEqual([name for name, _ in tracks], ['Ascent', 'Traverse', 'Empty'])
+        self.assertEqual(tracks[0][1].shape, (4, 3))
+        self.assertEqual(tracks[0][1][0].tolist(), [5.6, 45.1, 200.0])
+        self.assertEqual(len(waypoints), 3)
+
+    def test_import_tracks(self):
+        trek = Trek(name='Trek')
+        self.user.treks.append(trek)
+        self.user.markers.append(Marker(name='Start', address='Start'))
+        db.session.commit()
+
+        routes, markers = import_tracks(trek, io.BytesIO(TRACKS), folder=self.folder)
+
+        self.assertEqual([route.name for route in routes], ['Ascent', 'Traverse'])
+        self.assertEqual(markers, 2)
+        ascent = Route.query.filter_by(name='Ascent').one()
+        self.assertEqual(ascent.status, 'ready')
+        self.assertEqual([marker.name for marker in ascent.markers], ['Start', 'Summit'])
+        self.assertEqual(ascent.points()[2, 2], 600.0)
+        self.assertEqual((ascent.ascent, ascent.descent), (500.0, 0.0))
+        self.assertAlmostEqual(ascent.distance, 13610, delta=1)
+        self.assertEqual(Marker.query.filter_by(name='Summit').one().elevation, 1000.0)
+        self.assertEqual(trek.routes_count, 2)
+        self.assertEqual(trek.total_ascent, 500.0)
+        self.assertEqual(trek.total_descent, 50.0)
+
+        routes, _ = import_tracks(trek, io.BytesIO(TRACKS), folder=self.folder)
+        self.assertEqual([route.name for route in routes], ['Ascent (2)', 'Traverse (2)'])
+        self.assertEqual(Marker.query.count(), 3)
+
+    def test_import_tracks_names(self):
+        trek = Trek(name='Trek')
+        self.user.treks.append(trek)
+        other = User(username='other', email='other@example.com')
+        other.markers.append(Marker(name='Start', address='Start'))
+        db.session.add(other)
+        db.session.commit()
+
+        tracks = TRACKS.replace(b'<name>Traverse</name>', b'<name>Ascent</name>')
+        routes, _ = import_tracks(trek, io.BytesIO(tracks), folder=self.folder)
+
+        self.assertEqual([route.name for route in routes], ['Ascent', 'Ascent (2)'])
+        start = routes[0].markers[0]
+        self.assertEqual((start.name, start.user, start.elevation), ('Start (2)', self.user, 200.0))
+        self.assertEqual(other.markers.one().route_markers, [])
+
+    def test_upload_tracks(self):
+        trek = Trek(name='Trek')
+        self.user.treks.append(trek)
+        db.session.commit()
+
+        client = self.app.test_client()
+        client.post('/auth/login', data={'username': 'user', 'password': 'password'})
+        response = client.post(f'/api/treks/{trek.id}/import', data={'file': (io.BytesIO(TRACKS), 'tracks.gpx')},
+                               content_type='multipart/form-data')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([route['name'] for route in response.get_json()['routes']], ['Ascent', 'Traverse'])
+
+        response = client.post(f'/api/treks/{trek.id}/import', data={'file': (io.BytesIO(b'<gpx>'), 'broken.gpx')},
+                               content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
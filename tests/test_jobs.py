@@ -0,0 +1,96 @@
+import unittest
+from unittest.mock import patch
+
+
+from app import create_app, db, geometry, jobs
+from app.models import Route, Marker, Job, Profile, Preference
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    JOBS_EAGER = True
+
+
+class JobCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        Profile.insert_modes()
+        Preference.insert_options()
+
+        self.path = geometry.encode_polyline([[5.71854, 45.17788, 221.0], [-0.88308, 47.05861, 12.0]])
+        self.directions = patch('app.models.ors_client.directions', return_value=(self.path, 1000.0, 10.0, 20.0)).start()
+
+        self.route = Route(name='Route')
+        self.route.markers.append(Marker(name='Marker_1', latitude=45.17788, longitude=5.71854))
+        self.route.markers.append(Marker(name='Marker_2', latitude=47.05861, longitude=-0.88308))
+        db.session.add(self.route)
+        db.session.commit()
+
+    def tearDown(self):
+        patch.stopall()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_enqueue(self):
+        jobs.enqueue(self.route)
+        self.assertEqual(self.route.status, 'pending')
+        db.session.commit()
+
+        route = Route.query.get(self.route.id)
+        self.assertEqual(route.status, 'ready')
+        self.assertEqual(route.distance, 1000.0)
+        self.assertEqual(Job.query.count(), 0)
+
+    def test_deduplicate(self):
+        self.app.config['JOBS_EAGER'] = False
+        with patch('app.jobs.executor') as executor:
+            jobs.enqueue(self.route)
+            jobs.enqueue(self.route)
+            db.session.commit()
+            jobs.enqueue(self.route)
+            db.session.commit()
+
+        self.assertEqual(executor.return_value.submit.call_count, 1)
+        self.assertEqual(Job.query.count(), 1)
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(self.directions.call_count, 1)
+
+    def test_failed(self):
+        self.directions.return_value = None
+        jobs.enqueue(self.route)
+        db.session.commit()
+
+        self.assertEqual(Route.query.get(self.route.id).status, 'failed')
+
+    def test_stale(self):
+        def directions(*args, **kwargs):
+            db.session.add(Job(route_id=self.route.id))
+            db.session.flush()
+            return self.path, 1000.0, 10.0, 20.0
+
+        self.directions.side_effect = directions
+        jobs.enqueue(self.route)
+        db.session.commit()
+
+        self.assertEqual(self.directions.call_count, 1)
+        route = Route.query.get(self.route.id)
+        self.assertEqual(route.status, 'pending')
+        self.assertIsNone(route.distance)
+
+    def test_rollback(self):
+        jobs.enqueue(self.route)
+        db.session.rollback()
+        db.session.commit()
+
+        self.assertEqual(self.directions.call_count, 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
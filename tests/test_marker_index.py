@@ -0,0 +1,117 @@
+import unittest
+
+
+from app import create_app, db
+from app.models import User, Marker, marker_index
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SECRET_KEY = 'secret'
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+class MarkerIndexCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='user', email='user@example.com')
+        self.user.set_password('password')
+        self.other = User(username='other', email='other@example.com')
+        db.session.add_all([self.user, self.other])
+        db.session.commit()
+
+        self.markers = {}
+        for name, latitude, longitude in [('Grenoble', 45.17788, 5.71854), ('Bastille', 45.19880, 5.72524),
+                                          ('Vizille', 45.07806, 5.77083), ('Lyon', 45.76404, 4.83566),
+                                          ('Fiji', -17.8, 179.9), ('Samoa', -13.8, -171.8)]:
+            self.markers[name] = Marker(name=name, latitude=latitude, longitude=longitude, user_id=self.user.id)
+        self.markers['Other'] = Marker(name='Other', latitude=45.17789, longitude=5.71855, user_id=self.other.id)
+        db.session.add_all(self.markers.values())
+        db.session.commit()
+
+        self.query = Marker.query.filter_by(user_id=self.user.id)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def indexed(self):
+        return {id: (latitude, longitude) for id, latitude, _, longitude, _ in db.session.execute(db.select(marker_index))}
+
+    def test_sync(self):
+        self.assertEqual(len(self.indexed()), 7)
+
+        marker = self.markers['Lyon']
+        marker.latitude, marker.longitude = 48.85661, 2.35222
+        db.session.commit()
+        self.assertAlmostEqual(self.indexed()[marker.id][0], 48.85661, places=4)
+
+        marker.latitude = None
+        db.session.commit()
+        self.assertNotIn(marker.id, self.indexed())
+
+        db.session.delete(self.markers['Vizille'])
+        db.session.commit()
+        self.assertEqual(len(self.indexed()), 5)
+
+        db.session.execute(marker_index.delete())
+        Marker.reindex()
+        self.assertEqual(len(self.indexed()), 5)
+
+    def test_within(self):
+        markers = Marker.within(self.query, 45.1, 5.7, 45.2, 5.8).order_by(Marker.name).all()
+        self.assertEqual([marker.name for marker in markers], ['Bastille', 'Grenoble'])
+
+        markers = Marker.within(self.query, -20, 179, -10, -170).order_by(Marker.name).all()
+        self.assertEqual([marker.name for marker in markers], ['Fiji', 'Samoa'])
+
+    def test_near(self):
+        found = Marker.near(self.query, 45.17788, 5.71854, 3000)
+
+        self.assertEqual([marker.name for marker, _ in found], ['Grenoble', 'Bastille'])
+        self.assertEqual(found[0][1], 0.0)
+        self.assertAlmostEqual(found[1][1], 2380, delta=10)
+
+    def test_nearest(self):
+        found = Marker.nearest(self.query, 45.0, 5.8, 3)
+
+        self.assertEqual([marker.name for marker, _ in found], ['Vizille', 'Grenoble', 'Bastille'])
+        self.assertEqual(len(Marker.nearest(self.query, 45.0, 5.8, 10)), 6)
+
+    def test_endpoint(self):
+        client = self.app.test_client()
+        client.post('/auth/login', data={'username': 'user', 'password': 'password'})
+
+        response = client.get('/api/markers/nearby?bbox=5.7,45.1,5.8,45.2')
+        self.assertEqual([feature['properties']['name'] for feature in response.get_json()['features']],
+                         ['Bastille', 'Grenoble'])
+
+        response = client.get('/api/markers/nearby?lat=45.17788&lon=5.71854&radius=3000')
+        features = response.get_json()['features']
+        self.assertEqual([feature['properties']['name'] for feature in features], ['Grenoble', 'Bastille'])
+        self.assertEqual(features[0]['geometry']['coordinates'], [5.71854, 45.17788])
+
+        response = client.get('/api/markers/nearby?lat=45.17788&lon=5.71854&radius=1e9')
+        self.assertEqual([feature['properties']['name'] for feature in response.get_json()['features']],
+                         ['Grenoble', 'Bastille', 'Vizille'])
+
+        response = client.get('/api/markers/nearby?lat=45.0&lon=5.8&k=1')
+        self.assertEqual([feature['properties']['name'] for feature in response.get_json()['features']], ['Vizille'])
+
+        for arguments in ('bbox=5.0,44.0,6.0,46.0&limit=-1', 'lat=45.0&lon=5.8&k=-1', 'lat=45.0&lon=5.8&k=5&limit=0'):
+            response = client.get(f'/api/markers/nearby?{arguments}')
+            self.assertEqual(len(response.get_json()['features']), 1)
+
+        self.assertEqual(client.get('/api/markers/nearby').status_code, 400)
+        self.assertEqual(client.get('/api/markers/nearby?bbox=1,2').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
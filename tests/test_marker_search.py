@@ -0,0 +1,96 @@
+import unittest
+
+
+from app import create_app, db
+from app.models import User, Trek, Route, Marker, Folder, Profile, Preference
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SECRET_KEY = 'secret'
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+class MarkerSearchCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        Profile.insert_modes()
+        Preference.insert_options()
+
+        self.user = User(username='user', email='user@example.com')
+        self.user.set_password('password')
+        other = User(username='other', email='other@example.com')
+        self.ski = Folder(name='Ski')
+        db.session.add_all([self.user, other, self.ski])
+        db.session.commit()
+
+        for name in ['Écrins', 'Ecrouves', 'Grenoble', 'Chamrousse', 'Chamonix', 'Chambéry']:
+            self.user.markers.append(Marker(name=name, address=name, folder=self.ski if name.startswith('Cham') else None))
+        other.markers.append(Marker(name='Charmant Som', address='Charmant Som'))
+        self.trek = Trek(name='Trek', routes=[Route(name='Route')])
+        self.user.treks.append(self.trek)
+        db.session.commit()
+
+        self.query = Marker.query.filter_by(user_id=self.user.id)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_normalize(self):
+        self.assertEqual(Marker.normalize('  Chambéry  Centre '), 'chambery centre')
+        self.assertEqual(Marker.query.filter_by(name='Écrins').one().search_name, 'ecrins')
+
+    def test_search(self):
+        markers, has_next = Marker.search(self.query, 'ecr')
+        self.assertEqual([marker.name for marker in markers], ['Écrins', 'Ecrouves'])
+        self.assertFalse(has_next)
+
+        markers, has_next = Marker.search(self.query, 'CH', per_page=2)
+        self.assertEqual([marker.name for marker in markers], ['Chambéry', 'Chamonix'])
+        self.assertTrue(has_next)
+        markers, has_next = Marker.search(self.query, 'CH', page=2, per_page=2)
+        self.assertEqual([marker.name for marker in markers], ['Chamrousse'])
+        self.assertFalse(has_next)
+
+        self.assertEqual(len(Marker.search(self.query, '')[0]), 6)
+
+    def test_endpoint(self):
+        client = self.app.test_client()
+        client.post('/auth/login', data={'username': 'user', 'password': 'password'})
+
+        data = client.get('/api/markers/search?q=gre').get_json()
+        self.assertEqual([marker['name'] for marker in data['markers']], ['Grenoble'])
+
+        data = client.get(f'/api/markers/search?folder={self.ski.id}&per_page=1&page=3').get_json()
+        self.assertEqual([marker['name'] for marker in data['markers']], ['Chamrousse'])
+        self.assertEqual((data['page'], data['has_next']), (3, False))
+
+    def test_add_trek_route_marker(self):
+        client = self.app.test_client()
+        client.post('/auth/login', data={'username': 'user', 'password': 'password'})
+        route = self.trek.routes[0]
+        url = f'/trek/{self.trek.id}/route/{route.id}/marker/add'
+
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b'Grenoble', response.data)
+
+        other = Marker.query.filter_by(name='Charmant Som').one()
+        self.assertIn('Unknown marker.', client.post(url, data={'marker': other.id}).get_json())
+        self.assertEqual(route.markers, [])
+
+        marker = Marker.query.filter_by(name='Grenoble').one()
+        self.assertEqual(client.post(url, data={'marker': marker.id}).get_json(), {'status': 'ok'})
+        self.assertEqual(route.markers, [marker])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
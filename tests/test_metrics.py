@@ -0,0 +1,134 @@
+import os
+import sys
+import json
+import tempfile
+import subprocess
+import unittest
+
+
+from app import create_app, db, geometry, metrics
+from app.cache import geocode_stats
+from app.models import User, Trek, Route, Profile, Preference
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SECRET_KEY = 'secret'
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+class MetricsCase(unittest.TestCase):
+    def setUp(self):
+        for metric in metrics.registry:
+            metric.reset()
+        geocode_stats.reset()
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        Profile.insert_modes()
+        Preference.insert_options()
+
+        self.user = User(username='user', email='user@example.com')
+        self.user.set_password('password')
+        self.trek = Trek(name='Trek')
+        self.trek.routes.append(Route(name='Route', geometry=geometry.pack([[5.71854, 45.17788, 221.0], [5.72, 45.18, 230.5]])))
+        self.user.treks.append(self.trek)
+        db.session.add(self.user)
+        db.session.commit()
+
+        self.client = self.app.test_client()
+        self.client.post('/auth/login', data={'username': 'user', 'password': 'password'})
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        self.directory.cleanup()
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.mimetype.startswith('text/plain'))
+        return response.get_data(as_text=True).splitlines()
+
+    def test_requests(self):
+        self.client.get('/index')
+        lines = self.scrape()
+
+        self.assertIn('# TYPE http_request_seconds histogram', lines)
+        self.assertIn('http_request_seconds_count{endpoint="main.index",method="GET",status="200"} 1', lines)
+        self.assertIn('http_request_seconds_bucket{endpoint="main.index",method="GET",status="200",le="+Inf"} 1', lines)
+
+    def test_ors(self):
+        metrics.ors_requests.inc('directions', '200')
+        metrics.ors_requests.inc('directions', '503', amount=2)
+        metrics.ors_latency.observe(0.3, 'directions')
+        metrics.ors_failures.inc('geocode')
+        lines = self.scrape()
+
+        self.assertIn('ors_requests_total{operation="directions",status="503"} 2', lines)
+        self.assertIn('ors_request_seconds_bucket{operation="directions",le="0.25"} 0', lines)
+        self.assertIn('ors_request_seconds_bucket{operation="directions",le="0.5"} 1', lines)
+        self.assertIn('ors_failures_total{operation="geocode"} 1', lines)
+
+    def test_caches(self):
+        geocode_stats.hit()
+        geocode_stats.hit()
+        geocode_stats.hit()
+        geocode_stats.miss()
+        lines = self.scrape()
+
+        self.assertIn('cache_requests_total{cache="geocode",result="hit"} 3', lines)
+        self.assertIn('cache_hit_ratio{cache="geocode"} 0.75', lines)
+
+    def test_gpx_bytes(self):
+        response = self.client.get(f'/get-file/{self.trek.id}')
+        size = len(response.get_data())
+
+        self.assertIn(f'gpx_export_bytes_total {size}', self.scrape())
+
+    def test_processes(self):
+        self.app.config.update(METRICS_DIRECTORY=self.directory.name, METRICS_FLUSH_INTERVAL=0)
+        metrics.ors_requests.inc('geocode', '200')
+        self.client.get('/index')
+        self.assertTrue(os.path.exists(metrics.process_file(self.directory.name)))
+
+        with open(os.path.join(self.directory.name, '1.json'), 'w') as stream:
+            json.dump({"metrics": {"ors_requests_total": [[["geocode", "200"], 4]]},
+                       "caches": {"geocode": [1, 1]}, "pool": {}}, stream)
+
+        lines = self.scrape()
+        self.assertIn('ors_requests_total{operation="geocode",status="200"} 5', lines)
+        self.assertIn('cache_hit_ratio{cache="geocode"} 0.5', lines)
+
+    def test_stale_processes(self):
+        self.app.config.update(METRICS_DIRECTORY=self.directory.name, METRICS_FLUSH_INTERVAL=0)
+        metrics.ors_requests.inc('geocode', '200')
+        self.client.get('/index')
+
+        exited = subprocess.Popen([sys.executable, '-c', ''])
+        exited.wait()
+        stale = {"metrics": {"ors_requests_total": [[["geocode", "200"], 4]]}, "caches": {}, "pool": {"checkedout": 7}}
+        for pid in (1, exited.pid):
+            with open(metrics.process_file(self.directory.name, pid), 'w') as stream:
+                json.dump(stale, stream)
+        os.utime(metrics.process_file(self.directory.name, 1), (0, 0))
+
+        lines = self.scrape()
+        self.assertIn('ors_requests_total{operation="geocode",status="200"} 1', lines)
+        self.assertNotIn('db_pool_checkedout 7', lines)
+        self.assertEqual(os.listdir(self.directory.name), [os.path.basename(metrics.process_file(self.directory.name))])
+
+        with open(metrics.process_file(self.directory.name, 1), 'w') as stream:
+            json.dump(stale, stream)
+        self.assertEqual(metrics.collect(self.directory.name)["pool"], metrics.pool_usage())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,121 @@
+import unittest
+from datetime import datetime, timedelta
+
+
+from app import create_app, db
+from app.models import User, Trek, Marker, Folder
+from app.pagination import TREK_SORTS, keyset, encode_cursor
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SECRET_KEY = 'secret'
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    TREKS_PER_PAGE = 3
+    MARKERS_PER_PAGE = 2
+
+
+class PaginationCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='user', email='user@example.com')
+        self.user.set_password('password')
+        other = User(username='other', email='other@example.com')
+        self.folder = Folder(name='Ski')
+        db.session.add_all([self.user, other, self.folder])
+        db.session.commit()
+
+        start = datetime(2022, 1, 1)
+        for i, name in enumerate(['Vercors', 'Belledonne', 'Chartreuse', 'Oisans', 'Taillefer', 'Devoluy', 'Trieves']):
+            self.user.treks.append(Trek(name=name, timestamp=start + timedelta(days=i)))
+        db.session.add(Trek(name='Unsorted', user_id=self.user.id))
+        other.treks.append(Trek(name='Other'))
+        for name in ['Croix de Chamrousse', 'Chamechaude', 'Moucherotte', 'Dent de Crolles', 'Grand Som']:
+            self.user.markers.append(Marker(name=name, address=name, folder=self.folder))
+        other.markers.append(Marker(name='Obiou', address='Obiou', folder=self.folder))
+        db.session.commit()
+
+        for trek in self.user.treks:
+            Trek.query.filter_by(id=trek.id).update({'total_distance': float(trek.position % 3)})
+        Trek.query.filter_by(name='Unsorted').update({'position': None, 'total_distance': 5.0, 'timestamp': None})
+        db.session.commit()
+
+        self.query = Trek.query.filter_by(user_id=self.user.id)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def walk(self, sort, order):
+        names, cursor = [], None
+        while True:
+            treks, cursor = keyset(self.query, TREK_SORTS, sort, order, Trek.id, cursor, per_page=3)
+            names += [trek.name for trek in treks]
+            if cursor is None:
+                return names
+
+    def test_keyset(self):
+        for sort, column in TREK_SORTS.items():
+            for order in ('asc', 'desc'):
+                expected = self.query.order_by(column.desc().nullslast() if order == 'desc' else column.asc().nullsfirst(),
+                                               Trek.id.desc() if order == 'desc' else Trek.id.asc()).all()
+                self.assertEqual(self.walk(sort, order), [trek.name for trek in expected], (sort, order))
+
+        self.assertEqual(self.walk('position', 'asc')[:2], ['Unsorted', 'Vercors'])
+        self.assertEqual(self.walk('distance', 'desc')[:3], ['Unsorted', 'Devoluy', 'Chartreuse'])
+
+    def test_cursor(self):
+        with self.assertRaises(ValueError):
+            keyset(self.query, TREK_SORTS, 'position', 'asc', Trek.id, encode_cursor('name', 'asc', 'Oisans', 4))
+        with self.assertRaises(ValueError):
+            keyset(self.query, TREK_SORTS, 'position', 'asc', Trek.id, 'garbage')
+
+    def test_api(self):
+        client = self.app.test_client()
+        client.post('/auth/login', data={'username': 'user', 'password': 'password'})
+
+        data = client.get('/api/treks?sort=timestamp&order=desc').get_json()
+        self.assertEqual([trek['name'] for trek in data['treks']], ['Trieves', 'Devoluy', 'Taillefer'])
+        cursor = data['next']
+        data = client.get(f"/api/treks?sort=timestamp&order=desc&after={cursor}").get_json()
+        self.assertEqual([trek['name'] for trek in data['treks']], ['Oisans', 'Chartreuse', 'Belledonne'])
+        self.assertEqual(client.get(f"/api/treks?sort=name&after={cursor}").status_code, 400)
+
+        data = client.get(f'/api/markers?folder={self.folder.id}').get_json()
+        self.assertEqual([marker['name'] for marker in data['markers']], ['Chamechaude', 'Croix de Chamrousse'])
+        data = client.get(f"/api/markers?folder={self.folder.id}&after={data['next']}").get_json()
+        self.assertEqual([marker['name'] for marker in data['markers']], ['Dent de Crolles', 'Grand Som'])
+
+        self.assertEqual(client.get('/api/treks?sort=length').status_code, 400)
+
+    def test_views(self):
+        client = self.app.test_client()
+        client.post('/auth/login', data={'username': 'user', 'password': 'password'})
+
+        response = client.get('/treks?sort=name')
+        self.assertIn(b'Belledonne', response.data)
+        self.assertNotIn(b'Oisans', response.data)
+        self.assertIn(b'Next page', response.data)
+
+        response = client.get('/markers')
+        self.assertIn(b'Chamechaude', response.data)
+        self.assertNotIn(b'Dent de Crolles', response.data)
+        self.assertNotIn(b'Obiou', response.data)
+
+        _, cursor = keyset(Marker.query.filter_by(user_id=self.user.id), {'name': Marker.name}, 'name', 'asc', Marker.id,
+                           per_page=2)
+        response = client.get(f'/markers?folder={self.folder.id}&after={cursor}')
+        self.assertIn(b'Dent de Crolles', response.data)
+        self.assertIn(b'All folders', response.data)
+        self.assertEqual(client.get('/markers?folder=99').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
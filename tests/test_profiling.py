@@ -0,0 +1,86 @@
+import os
+import time
+import tempfile
+import unittest
+
+
+from app import create_app, db
+from app.models import User
+from app.profiling import record_ors
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+def slow_view():
+    User.query.count()
+    record_ors(0.02)
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        pass
+    return 'ok'
+
+
+class ProfilingCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.app = create_app(TestConfig)
+        self.app.config['PROFILER_DIRECTORY'] = self.directory.name
+        self.app.add_url_rule('/slow', 'slow', slow_view)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        self.directory.cleanup()
+
+    def test_server_timing(self):
+        response = self.client.get('/slow')
+        timing = dict(part.strip().split(';', 1) for part in response.headers['Server-Timing'].split(','))
+
+        self.assertIn('desc="1 queries"', timing['db'])
+        self.assertEqual(timing['ors'], 'dur=20.0;desc="1 calls"')
+        self.assertGreaterEqual(float(timing['app'].split('=')[1]), 50)
+
+    def test_slow_query(self):
+        self.app.config['SQLALCHEMY_SLOW_DB_QUERY_TIME'] = 0
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            self.client.get('/slow')
+
+        self.assertTrue(any('Slow query in slow' in line and 'FROM user' in line for line in logs.output))
+
+    def test_slow_request(self):
+        self.app.config['SLOW_REQUEST_TIME'] = 0.01
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            self.client.get('/slow')
+
+        self.assertTrue(any('Slow request GET /slow 200' in line and '1 ORS calls' in line for line in logs.output))
+
+    def test_profiler(self):
+        self.app.config.update(PROFILER_ENABLED=True, PROFILER_THRESHOLD=0.01, PROFILER_INTERVAL=0.001)
+        self.client.get('/slow')
+
+        profiles = os.listdir(self.directory.name)
+        self.assertEqual(len(profiles), 1)
+        self.assertTrue(profiles[0].endswith('-slow.folded'))
+        with open(os.path.join(self.directory.name, profiles[0])) as stream:
+            lines = stream.read().splitlines()
+        self.assertTrue(any('tests.test_profiling:slow_view' in line for line in lines))
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
+
+    def test_profiler_threshold(self):
+        self.app.config.update(PROFILER_ENABLED=True, PROFILER_THRESHOLD=10)
+        self.client.get('/slow')
+
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,117 @@
+import unittest
+
+
+from app import create_app, db
+from app.cache import reference_stats
+from app.models import User, Trek, Route, Country, Folder, Profile, Preference, ReferenceVersion, invalidate_references
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SECRET_KEY = 'secret'
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    REFERENCE_CACHE_INTERVAL = 60
+
+
+class ReferenceCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        Profile.insert_modes()
+        Preference.insert_options()
+        db.session.add_all([Country(name='France', default=True), Country(name='Belgium'), Folder(name='Ski')])
+        db.session.commit()
+
+        self.statements = []
+        db.event.listen(db.engine, 'before_cursor_execute', self.record)
+        reference_stats.reset()
+
+    def tearDown(self):
+        db.event.remove(db.engine, 'before_cursor_execute', self.record)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def record(self, connection, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def test_lookups(self):
+        self.assertEqual(Country.choices(), [(2, 'Belgium'), (1, 'France')])
+        self.statements.clear()
+
+        self.assertEqual(Country.cached_default().name, 'France')
+        self.assertEqual(Profile.cached_default().name, 'Cycling')
+        self.assertEqual(Folder.cached(1).name, 'Ski')
+        self.assertIsNone(Folder.cached(2))
+        self.assertEqual([profile.name for profile in Profile.cached_all()], ['Driving', 'Cycling', 'Walking', 'Hicking'])
+        self.assertEqual(self.statements, [])
+        self.assertEqual(reference_stats.misses, 1)
+
+    def test_session(self):
+        profile = Profile.query.filter_by(name='Walking').one()
+        self.assertIs(Profile.cached(profile.id), profile)
+        self.assertIn(Country.cached_default(), db.session)
+
+    def test_route_defaults(self):
+        Profile.choices()
+        version = ReferenceVersion.current()
+        self.statements.clear()
+        trek = Trek(name='Trek')
+        trek.routes.append(Route(name='Route'))
+        self.assertEqual(self.statements, [])
+
+        db.session.add(trek)
+        db.session.commit()
+        route = Route.query.one()
+        self.assertEqual((route.profile.name, route.preference.name), ('Cycling', 'Shortest'))
+        self.assertEqual(ReferenceVersion.current(), version)
+
+    def test_invalidation(self):
+        self.assertEqual(len(Country.choices()), 2)
+        version = ReferenceVersion.current()
+
+        db.session.add(Country(name='Italy'))
+        db.session.commit()
+        self.assertEqual(len(Country.choices()), 3)
+        self.assertEqual(ReferenceVersion.current(), version + 1)
+
+        db.session.execute(db.text("INSERT INTO country (name) VALUES ('Spain')"))
+        db.session.commit()
+        self.assertEqual(len(Country.choices()), 3)
+        invalidate_references()
+        db.session.commit()
+        self.assertEqual(len(Country.choices()), 4)
+
+    def test_other_process(self):
+        self.assertEqual(len(Country.choices()), 2)
+        db.session.execute(db.text("INSERT INTO country (name) VALUES ('Spain')"))
+        db.session.execute(db.text("UPDATE reference_version SET version = version + 1"))
+        db.session.commit()
+
+        self.assertEqual(len(Country.choices()), 2)
+        self.app.extensions['references'].interval = 0
+        self.assertEqual(len(Country.choices()), 3)
+
+    def test_views(self):
+        user = User(username='user', email='user@example.com')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        client = self.app.test_client()
+        client.post('/auth/login', data={'username': 'user', 'password': 'password'})
+
+        Country.choices()
+        self.statements.clear()
+        response = client.get('/marker/add')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Belgium', response.data)
+        self.assertFalse([statement for statement in self.statements if 'country' in statement or 'folder' in statement])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -1,7 +1,7 @@
 import unittest
 
 
-from app import create_app, db
+from app import create_app, db, geometry
 from app.models import Route, Marker, Profile, Preference
 from config import Config
 
@@ -81,6 +81,16 @@ class RouteModelCase(unittest.TestCase):
         route.markers.remove(marker)
         self.assertEqual(len(route.markers), 0)
 
+    def test_geometry(self):
+        points = [[5.71854, 45.17788, 221.0], [5.72, 45.18, 230.5]] * 5000
+        route = Route(geometry=geometry.pack(points))
+        db.session.add(route)
+        db.session.commit()
+
+        route = Route.query.first()
+        self.assertEqual(route.points().shape, (10000, 3))
+        self.assertEqual(route.coordinates()[:2], [[45.17788, 5.71854, 221.0], [45.18, 5.72, 230.5]])
+
     def test_mode(self):
         route = Route()
         route.profile = Profile.query.filter_by(default=True).first()
@@ -0,0 +1,97 @@
+import os
+import time
+import unittest
+
+
+from app import create_app, db
+from app.geocoding import ors_client
+from app.metrics import ors_requests
+from app.models import Marker, Route, Country, Profile, Preference
+from app.standin import create_standin, serve
+from config import Config
+
+
+RECORDINGS = os.path.join(os.path.dirname(__file__), 'recordings', 'ors.json')
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    DIRECTIONS_CACHE_BACKEND = 'memory'
+    ORS_TOKEN = 'dummy'
+    ORS_BACKOFF = 0.001
+
+
+class StandinCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = serve(create_standin(RECORDINGS))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.connect(self.server)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        Profile.insert_modes()
+        Preference.insert_options()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def connect(self, server):
+        self.app.config['ORS_BASE_URL'] = f"http://127.0.0.1:{server.server_port}"
+        ors_client.init_app(self.app)
+
+    def test_synthesized(self):
+        country = Country(name='France')
+        marker_1 = Marker(name='Marker_1', address='Chamrousse', country=country)
+        marker_2 = Marker(name='Marker_2', address='Vizille', country=country)
+        self.assertTrue(marker_1.update())
+        self.assertTrue(marker_2.update())
+        self.assertEqual(ors_client.search("Vizille, France"), [marker_2.longitude, marker_2.latitude])
+        self.assertIsNotNone(marker_1.elevation)
+
+        route = Route(name='Route')
+        route.markers.append(marker_1)
+        route.markers.append(marker_2)
+        self.assertTrue(route.update())
+
+        points = route.points()
+        self.assertGreater(len(points), 2)
+        self.assertAlmostEqual(points[0][0], marker_1.longitude, places=4)
+        self.assertAlmostEqual(points[-1][1], marker_2.latitude, places=4)
+        self.assertGreater(route.distance, 0)
+
+    def test_errors(self):
+        server = serve(create_standin(error_rate=1.0, seed=1))
+        try:
+            self.connect(server)
+            ors_requests.reset()
+
+            self.assertIsNone(ors_client.search("Grenoble, France"))
+            self.assertEqual(ors_requests.value('geocode', '503'), self.app.config['ORS_RETRIES'] + 1)
+        finally:
+            server.shutdown()
+
+    def test_latency(self):
+        server = serve(create_standin(latency=0.05))
+        try:
+            self.connect(server)
+            start = time.perf_counter()
+            ors_client.elevation(45.177879, 5.718545)
+
+            self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+        finally:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
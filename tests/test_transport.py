@@ -0,0 +1,92 @@
+import time
+import unittest
+from unittest.mock import patch, Mock
+
+
+import requests
+
+
+from app.geocoding import ORSClient
+from app.metrics import ors_requests, ors_latency, ors_failures
+from app.transport import ORSTransport, TokenBucket
+
+
+def response(status, body=None, headers=None):
+    return Mock(status_code=status, json=Mock(return_value=body or {}), headers=headers or {}, request=None)
+
+
+class TransportCase(unittest.TestCase):
+    def setUp(self):
+        ors_requests.reset()
+        ors_latency.reset()
+        self.transport = ORSTransport('token', retries=2, backoff=0.01)
+        self.sleep = patch('app.transport.time.sleep').start()
+
+    def tearDown(self):
+        patch.stopall()
+
+    def test_operation(self):
+        self.assertEqual(ORSTransport.operation('/v2/directions/foot-walking/json'), 'directions')
+        self.assertEqual(ORSTransport.operation('/elevation/point'), 'elevation')
+        self.assertEqual(ORSTransport.operation('/geocode/search'), 'geocode')
+
+    def test_retry(self):
+        get = patch.object(self.transport._session, 'get', side_effect=[
+            response(503), response(429, headers={'Retry-After': '2'}), response(200, {'features': []})]).start()
+
+        self.assertEqual(self.transport.request('/geocode/search', {'text': 'Grenoble'}), {'features': []})
+        self.assertEqual(get.call_count, 3)
+        self.assertEqual(self.sleep.call_args_list[1].args, (2.0,))
+        self.assertEqual(ors_requests.value('geocode', '503'), 1)
+        self.assertEqual(ors_requests.value('geocode', '200'), 1)
+        self.assertEqual(ors_latency.count('geocode'), 3)
+
+    def test_retry_exhausted(self):
+        patch.object(self.transport._session, 'post', return_value=response(502)).start()
+
+        client = ORSClient()
+        client.client = self.transport
+        self.assertIsNone(client.elevation(45.17788, 5.71854))
+        self.assertEqual(ors_requests.value('elevation', '502'), 3)
+
+    def test_retry_after_too_long(self):
+        get = patch.object(self.transport._session, 'get', return_value=response(
+            429, headers={'Retry-After': '3600'})).start()
+        ors_failures.reset()
+
+        client = ORSClient()
+        client.client = self.transport
+        self.assertIsNone(client.search('Grenoble'))
+        self.assertEqual(get.call_count, 1)
+        self.sleep.assert_not_called()
+        self.assertEqual(ors_failures.value('geocode'), 1)
+
+    def test_backoff_capped(self):
+        transport = ORSTransport('token', backoff=1.0, max_backoff=2.0)
+
+        self.assertLessEqual(max(transport.delay(10) for _ in range(100)), 2.0)
+
+    def test_timeout(self):
+        patch.object(self.transport._session, 'get', side_effect=requests.exceptions.ReadTimeout()).start()
+
+        client = ORSClient()
+        client.client = self.transport
+        self.assertIsNone(client.search('Grenoble'))
+        self.assertEqual(ors_requests.value('geocode', 'timeout'), 3)
+
+    def test_session(self):
+        adapter = self.transport._session.get_adapter('https://api.openrouteservice.org')
+        self.assertEqual(adapter._pool_maxsize, 10)
+
+
+class TokenBucketCase(unittest.TestCase):
+    def test_acquire(self):
+        bucket = TokenBucket(rate=100.0, capacity=2)
+        start = time.monotonic()
+        for _ in range(4):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.015)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
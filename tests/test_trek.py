@@ -1,8 +1,12 @@
 import unittest
 
 
-from app import create_app, db
-from app.models import Trek, Route, Profile, Preference
+from flask import g, current_app
+
+
+from app import create_app, db, geometry
+from app.geocoding import stream_trek_as_gpx
+from app.models import User, Trek, Route, Marker, Profile, Preference
 from config import Config
 
 
@@ -78,6 +82,106 @@ class TrekModelCase(unittest.TestCase):
         trek.routes.remove(route)
         self.assertEqual(len(trek.routes), 0)
 
+    def test_elevation_profile(self):
+        trek = Trek(name='Trek')
+        trek.routes.append(Route(geometry=geometry.pack([[5.71854, 45.17788, 221.0], [5.72, 45.18, 230.0]])))
+        trek.routes.append(Route(geometry=geometry.pack([[5.72, 45.18, 230.0], [5.73, 45.19, 250.0]])))
+
+        db.session.add(trek)
+        db.session.commit()
+
+        profile = trek.elevation_profile()
+        self.assertEqual(len(profile), 4)
+        self.assertEqual(profile[0], {"x": 0.0, "y": 221.0})
+        self.assertEqual(profile[2]["x"], profile[1]["x"])
+        self.assertEqual(profile[3]["y"], 250.0)
+
+    def test_geometry_decodes(self):
+        trek = Trek(name='Trek', user=User(username='user', email='user@example.com'))
+        route_1 = Route(geometry=geometry.pack([[5.71854, 45.17788, 221.0], [5.72, 45.18, 230.0]]))
+        route_2 = Route(geometry=geometry.pack([[5.72, 45.18, 230.0], [5.73, 45.19, 250.0]]))
+        trek.routes.append(route_1)
+        trek.routes.append(route_2)
+
+        db.session.add(trek)
+        db.session.commit()
+        g.geometry_decodes = 0
+
+        trek.elevation_profile()
+        route_1.coordinates()
+        trek.gpx()
+        self.assertEqual(g.geometry_decodes, 2)
+
+        route_1.geometry = geometry.pack([[5.7, 45.1, 200.0]])
+        self.assertEqual(route_1.coordinates(), [[45.1, 5.7, 200.0]])
+        self.assertEqual(g.geometry_decodes, 3)
+
+        current_app.config['ROUTE_GEOMETRY_MEMO_SIZE'] = 1
+        g.pop('geometries')
+        route_1.coordinates()
+        route_2.coordinates()
+        self.assertEqual(list(g.geometries), [(route_2.id, route_2.timestamp)])
+        route_1.coordinates()
+        self.assertEqual(g.geometry_decodes, 6)
+
+    def test_gpx_stream(self):
+        trek = Trek(name='Trek & <co>', user=User(username='user', email='user@example.com'))
+        route_1 = Route(name='Route_1', geometry=geometry.pack([[5.71854, 45.17788, 221.0], [5.72, 45.18, 230.5]] * 1500))
+        route_2 = Route(name='Route_2')
+        route_1.markers.append(Marker(name='Marker_1', latitude=45.17788, longitude=5.71854, elevation=221))
+        route_1.markers.append(Marker(name='Marker_2', latitude=45.18, longitude=5.72))
+        trek.routes.append(route_1)
+        trek.routes.append(route_2)
+
+        db.session.add(trek)
+        db.session.commit()
+
+        self.assertEqual("".join(stream_trek_as_gpx(trek)), trek.gpx())
+
+        response = self.app.test_client().get(f'/get-file/{trek.id}')
+        self.assertEqual(response.data.decode('utf-8'), trek.gpx())
+        self.assertIn('attachment', response.headers['Content-Disposition'])
+
+    def test_sampled_profile(self):
+        self.app.config['ELEVATION_PROFILE_POINTS'] = 100
+        points = [[5.0 + i / 10000, 45.0, 200.0 + (1000.0 if i == 4321 else 0.0)] for i in range(10000)]
+        trek = Trek(name='Trek')
+        trek.routes.append(Route(geometry=geometry.pack(points)))
+
+        db.session.add(trek)
+        db.session.commit()
+
+        profile = trek.sampled_profile()
+        self.assertEqual(len(profile), 100)
+        self.assertEqual(profile[0]["x"], 0.0)
+        self.assertEqual(max(point["y"] for point in profile), 1200.0)
+        self.assertAlmostEqual(profile[-1]["x"], trek.elevation_profile()[-1]["x"], places=2)
+
+    def test_resample(self):
+        trek = Trek(name='Trek')
+        route = Route(geometry=geometry.pack([[5.71854, 45.17788, 221.0], [5.72, 45.18, 230.0]]))
+        trek.routes.append(route)
+        db.session.add(trek)
+        db.session.commit()
+        g.pop('geometries', None)
+        g.geometry_decodes = 0
+
+        trek.name = 'Renamed'
+        route.status = 'ready'
+        route.distance = 1000.0
+        db.session.commit()
+        self.assertEqual(trek.total_distance, 1000.0)
+        self.assertEqual(g.geometry_decodes, 0)
+
+        route.geometry = geometry.pack([[5.7, 45.1, 200.0], [5.71, 45.11, 300.0]])
+        db.session.commit()
+        self.assertEqual(g.geometry_decodes, 1)
+        self.assertEqual(max(point["y"] for point in trek.sampled_profile()), 300.0)
+
+        trek.routes.append(Route(geometry=geometry.pack([[5.71, 45.11, 300.0], [5.72, 45.12, 400.0]])))
+        db.session.commit()
+        self.assertEqual(max(point["y"] for point in trek.sampled_profile()), 400.0)
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -0,0 +1,83 @@
+import unittest
+
+
+from app import create_app, db, cli, geometry
+from app.models import Trek, Route, Marker, route_segment_index, marker_index
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+# Schema and rows of a database created by `flask sqlite create` before routes stored packed geometry.
+LEGACY_SCHEMA = """
+CREATE TABLE user (id INTEGER NOT NULL, username VARCHAR(64), email VARCHAR(128), password_hash VARCHAR(128),
+    timestamp DATETIME, PRIMARY KEY (id));
+CREATE TABLE country (id INTEGER NOT NULL, name VARCHAR(128), "default" BOOLEAN, timestamp DATETIME, PRIMARY KEY (id),
+    UNIQUE (name));
+CREATE TABLE folder (id INTEGER NOT NULL, name VARCHAR(64), timestamp DATETIME, PRIMARY KEY (id), UNIQUE (name));
+CREATE TABLE profile (id INTEGER NOT NULL, name VARCHAR(64), "default" BOOLEAN, timestamp DATETIME, PRIMARY KEY (id),
+    UNIQUE (name));
+CREATE TABLE preference (id INTEGER NOT NULL, name VARCHAR(64), "default" BOOLEAN, timestamp DATETIME,
+    PRIMARY KEY (id), UNIQUE (name));
+CREATE TABLE trek (id INTEGER NOT NULL, name VARCHAR(64), position INTEGER, timestamp DATETIME, user_id INTEGER,
+    PRIMARY KEY (id), UNIQUE (name), FOREIGN KEY(user_id) REFERENCES user (id));
+CREATE TABLE marker (id INTEGER NOT NULL, name VARCHAR(64), address VARCHAR(128), latitude FLOAT, longitude FLOAT,
+    elevation FLOAT, timestamp DATETIME, user_id INTEGER, country_id INTEGER, folder_id INTEGER, PRIMARY KEY (id),
+    UNIQUE (name), UNIQUE (address), FOREIGN KEY(user_id) REFERENCES user (id),
+    FOREIGN KEY(country_id) REFERENCES country (id), FOREIGN KEY(folder_id) REFERENCES folder (id));
+CREATE TABLE route (id INTEGER NOT NULL, name VARCHAR(64), path VARCHAR(8192), distance FLOAT, ascent FLOAT,
+    descent FLOAT, position INTEGER, timestamp DATETIME, trek_id INTEGER, mode_id INTEGER, option_id INTEGER,
+    PRIMARY KEY (id), UNIQUE (name), FOREIGN KEY(trek_id) REFERENCES trek (id),
+    FOREIGN KEY(mode_id) REFERENCES profile (id), FOREIGN KEY(option_id) REFERENCES preference (id));
+CREATE TABLE route_marker (route_id INTEGER NOT NULL, marker_id INTEGER NOT NULL, position INTEGER NOT NULL,
+    timestamp DATETIME, PRIMARY KEY (route_id, marker_id, position), FOREIGN KEY(route_id) REFERENCES route (id),
+    FOREIGN KEY(marker_id) REFERENCES marker (id));
+INSERT INTO user (id, username, email) VALUES (1, 'user', 'user@example.com');
+INSERT INTO profile (id, name, "default") VALUES (1, 'Cycling', 1);
+INSERT INTO preference (id, name, "default") VALUES (1, 'Shortest', 1);
+INSERT INTO trek (id, name, position, user_id) VALUES (1, 'Trek', 0, 1);
+INSERT INTO marker (id, name, address, latitude, longitude, elevation, user_id)
+    VALUES (1, 'Grenoble', 'Grenoble', 45.1, 5.7, 200, 1), (2, 'Voiron', 'Voiron', 45.2, 5.8, 300, 1);
+"""
+
+
+class UpgradeCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        cli.register(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+        connection = db.engine.raw_connection()
+        connection.executescript(LEGACY_SCHEMA)
+        path = geometry.encode_polyline([[5.7, 45.1, 200.0], [5.75, 45.15, 250.0], [5.8, 45.2, 300.0]])
+        connection.execute("INSERT INTO route (id, name, path, position, trek_id, mode_id, option_id) "
+                           "VALUES (1, 'Route', ?, 0, 1, 1, 1)", (path,))
+        connection.execute("INSERT INTO route_marker (route_id, marker_id, position) VALUES (1, 1, 0), (1, 2, 1)")
+        connection.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_upgrade(self):
+        result = self.app.test_cli_runner().invoke(args=['sqlite', 'upgrade'])
+
+        self.assertIsNone(result.exception, result.output)
+        self.assertIn("1 routes converted.", result.output)
+        route = Route.query.one()
+        self.assertEqual(route.points().shape, (3, 3))
+        self.assertEqual(Trek.query.one().routes_count, 1)
+        self.assertEqual(Marker.query.get(1).search_name, 'grenoble')
+        segments = db.session.execute(db.select(route_segment_index.c.id)).scalars().all()
+        self.assertEqual(len(segments), 2)
+        self.assertEqual(len(db.session.execute(db.select(marker_index.c.id)).all()), 2)
+        self.assertEqual([route for route, _, _ in Route.corridor(Route.query, 45.15, 5.75, 100)], [route])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,73 @@
+import unittest
+
+
+from app import create_app, db, geometry
+from app.models import User, Trek, Route, Marker, Country, Profile, Preference
+from app.profiling import QueryBudgetExceeded, query_budget
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SECRET_KEY = 'secret'
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+class ViewCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        Profile.insert_modes()
+        Preference.insert_options()
+
+        self.user = User(username='user', email='user@example.com')
+        self.user.set_password('password')
+        db.session.add(self.user)
+        db.session.commit()
+
+        self.client = self.app.test_client()
+        self.client.post('/auth/login', data={'username': 'user', 'password': 'password'})
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_treks(self, count):
+        country = Country(name='France')
+        for t in range(count):
+            trek = Trek(name=f'Trek_{t}')
+            self.user.treks.append(trek)
+            for r in range(3):
+                route = Route(name=f'Route_{t}_{r}', geometry=geometry.pack([[5.7, 45.1, 200.0], [5.8, 45.2, 300.0]]))
+                trek.routes.append(route)
+                for m in range(3):
+                    route.markers.append(Marker(name=f'Marker_{t}_{r}_{m}', latitude=45.1, longitude=5.7, elevation=200, country=country))
+        db.session.commit()
+
+    def test_pages(self):
+        self.add_treks(5)
+        trek = self.user.treks[0]
+
+        for url in ['/index', '/treks', f'/trek/{trek.id}/routes', f'/trek/{trek.id}/markers']:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+
+    def test_budget(self):
+        self.add_treks(1)
+
+        @self.app.route('/budget')
+        @query_budget(1)
+        def budget():
+            return str(sum(len(trek.routes) for trek in Trek.query.all()))
+
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/budget')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)